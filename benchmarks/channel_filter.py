@@ -0,0 +1,87 @@
+#! /usr/bin/env python3
+# Copyright (c) 2016-2025 Blaze <blaze@vivaldi.net>
+# Licensed under the GNU General Public License, version 3 or later.
+# See the file http://www.gnu.org/copyleft/gpl.txt.
+
+"""
+    Times building and showing a 20000 entry channel list and
+    filtering it as if typed in the filter box, a frame at 60 Hz
+    is 16.7 ms. The view lays the rows out in batches as tvnao's
+    does: the first frame, the longest event loop pass and the time
+    until every row is laid out are given.
+"""
+
+import os
+import sys
+import time
+from typing import Tuple
+
+import synthetic  # noqa: F401, puts the package on the path
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt6 import QtWidgets  # noqa: E402
+from tvnao.channel_model import ChannelList, ChannelModel, ChannelFilterModel  # noqa: E402
+
+
+def settle(app, view) -> Tuple[float, float]:
+    """
+        Runs the event loop until the view has laid out every batch,
+        returns the longest pass and the time it took in ms
+    """
+    bar = view.verticalScrollBar()
+    begin, longest, last, idle = time.perf_counter(), 0.0, None, 0
+    # every pass lays out a batch, the scroll range stops growing after
+    # the last one
+    while idle < 2:
+        start = time.perf_counter()
+        app.processEvents()
+        longest = max(longest, time.perf_counter() - start)
+        idle = idle + 1 if bar.maximum() == last else 0
+        last = bar.maximum()
+    return longest * 1000, (time.perf_counter() - begin) * 1000
+
+
+def main():
+    app = QtWidgets.QApplication(sys.argv)
+    entries = []
+    for i in range(20000):
+        if i % 100 == 0:
+            entries.append((f'Group {i // 100}', None, None))
+        entries.append((f'{i + 1}. Channel {i} HD', f'udp://239.0.{i // 256}.{i % 256}:1234',
+                        f'channel{i}'))
+    model = ChannelModel([f'channel{i}' for i in range(0, 20000, 7)])
+    proxy = ChannelFilterModel()
+    proxy.setSourceModel(model)
+    view = QtWidgets.QListView()
+    view.setUniformItemSizes(True)
+    view.setLayoutMode(QtWidgets.QListView.LayoutMode.Batched)
+    view.setBatchSize(500)
+    view.setModel(proxy)
+    view.show()
+    begin = time.perf_counter()
+    channels = ChannelList(entries)
+    print(f"build:          {(time.perf_counter() - begin) * 1000:.1f} ms")
+    begin = time.perf_counter()
+    model.set_channels(channels)
+    app.processEvents()
+    print(f"swap:           {(time.perf_counter() - begin) * 1000:.1f} ms")
+    print("                        first frame  longest pass  laid out")
+    for term, bookmarks in (('c', False), ('ch', False), ('channel 12', False),
+                            ('channel 123', False), ('', False), ('hd', True)):
+        begin = time.perf_counter()
+        proxy.set_filter(term, bookmarks)
+        app.processEvents()
+        first = (time.perf_counter() - begin) * 1000
+        longest, rest = settle(app, view)
+        print(f"{term or '(none)':12} {'bookmarks' if bookmarks else '':9}"
+              f" {first:6.1f} ms    {longest:6.1f} ms  {first + rest:6.1f} ms"
+              f"  {proxy.rowCount()} rows")
+    begin = time.perf_counter()
+    proxy.fold_all(True)
+    app.processEvents()
+    print(f"fold all:       {(time.perf_counter() - begin) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
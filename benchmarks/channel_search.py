@@ -0,0 +1,71 @@
+#! /usr/bin/env python3
+# Copyright (c) 2016-2025 Blaze <blaze@vivaldi.net>
+# Licensed under the GNU General Public License, version 3 or later.
+# See the file http://www.gnu.org/copyleft/gpl.txt.
+
+"""
+    Times typing a 6 character query into the filter box of a
+    20000 channel playlist, keystroke by keystroke, against a scan
+    lower-casing every name and against the search index alone and
+    behind the channel filter model
+"""
+
+import os
+import sys
+import time
+
+import synthetic  # noqa: F401, puts the package on the path
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt6 import QtWidgets  # noqa: E402
+from tvnao.channel_model import ChannelList, ChannelModel, ChannelFilterModel  # noqa: E402
+from tvnao.channel_search import ChannelSearch  # noqa: E402
+
+QUERY = 'news 1'
+WORDS = ('News', 'Sport', 'Movie', 'Kids', 'Music', 'Nature', 'Travel', 'Café')
+
+
+def main():
+    app = QtWidgets.QApplication(sys.argv)
+    entries = []
+    for i in range(20000):
+        if i % 100 == 0:
+            entries.append((f'Group {i // 100}', None, None))
+        entries.append((f'{i + 1}. {WORDS[i % len(WORDS)]} {i // len(WORDS)} HD',
+                        f'udp://239.0.{i // 256}.{i % 256}:1234', f'channel{i}'))
+    names = [x[0] for x in entries]
+
+    begin = time.perf_counter()
+    search = ChannelSearch(names)
+    print(f"index build:  {(time.perf_counter() - begin) * 1000:7.1f} ms")
+    for label, find in (
+            ('scan', lambda term: [x for x in names if term.lower() in x.lower()]),
+            ('index', search.find)):
+        total = 0
+        for i in range(1, len(QUERY) + 1):
+            begin = time.perf_counter()
+            matches = find(QUERY[:i])
+            total += time.perf_counter() - begin
+        print(f"{label + ':':13} {total * 1000:7.1f} ms for {len(QUERY)} keystrokes,"
+              f" {len(matches)} matches")
+
+    model = ChannelModel([])
+    proxy = ChannelFilterModel()
+    proxy.setSourceModel(model)
+    view = QtWidgets.QListView()
+    view.setUniformItemSizes(True)
+    view.setModel(proxy)
+    view.show()
+    model.set_channels(ChannelList(entries))
+    app.processEvents()
+    for i in range(1, len(QUERY) + 1):
+        begin = time.perf_counter()
+        proxy.set_filter(QUERY[:i], False)
+        app.processEvents()
+        print(f"model {QUERY[:i]!r:9} {(time.perf_counter() - begin) * 1000:7.1f} ms"
+              f"  {proxy.rowCount()} rows, first {proxy.index(1, 0).data()!r}")
+
+
+if __name__ == "__main__":
+    main()
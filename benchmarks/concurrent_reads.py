@@ -0,0 +1,60 @@
+#! /usr/bin/env python3
+# Copyright (c) 2016-2025 Blaze <blaze@vivaldi.net>
+# Licensed under the GNU General Public License, version 3 or later.
+# See the file http://www.gnu.org/copyleft/gpl.txt.
+
+"""
+    Hammers get_schedule from several threads while the guide
+    is being ingested and reports the slowest read, failing if
+    any read raised
+"""
+
+import datetime
+import threading
+import time
+
+from synthetic import make_archive, open_guide
+
+READERS = 8
+
+
+def main():
+    sh = open_guide()
+    # a new archive makes the next refresh re-ingest every channel
+    make_archive(sh.jtv_file, channels=300, programmes=7 * 48 - 1)
+    sh.refill = True
+
+    today = datetime.date.today().strftime("%Y%m%d")
+    done = threading.Event()
+    errors, reads, slowest = [], [0] * READERS, [0.0] * READERS
+
+    def read(n):
+        while not done.is_set():
+            begin = time.perf_counter()
+            try:
+                sh.get_schedule(today, f'channel{reads[n] % 300}', True)
+                sh.get_current_program(f'channel{reads[n] % 300}')
+            except Exception as e:
+                errors.append(e)
+            slowest[n] = max(slowest[n], time.perf_counter() - begin)
+            reads[n] += 1
+
+    readers = [threading.Thread(target=read, args=(x,)) for x in range(READERS)]
+    for reader in readers:
+        reader.start()
+    begin = time.perf_counter()
+    sh.refresh()
+    elapsed = time.perf_counter() - begin
+    done.set()
+    for reader in readers:
+        reader.join()
+    print(f"ingest:       {elapsed:.2f} s")
+    print(f"reads:        {sum(reads)} from {READERS} threads")
+    print(f"slowest read: {max(slowest) * 1000:.1f} ms")
+    print(f"errors:       {len(errors)} {errors[:3]}")
+    sh.close()
+    assert not errors, f"{len(errors)} reads failed during the ingest"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#! /usr/bin/env python3
+# Copyright (c) 2016-2025 Blaze <blaze@vivaldi.net>
+# Licensed under the GNU General Public License, version 3 or later.
+# See the file http://www.gnu.org/copyleft/gpl.txt.
+
+"""
+    Reports the size of schedule.db with the titles kept in their own
+    table against the same programmes stored with inline titles.
+    Takes the path of a real jtv.zip, a synthetic archive is used without it.
+"""
+
+import os
+import sqlite3
+import sys
+
+from synthetic import open_guide
+
+
+def inline_size(sh, filename: str) -> int:
+    """
+        Size of a database holding the day tables with inline titles
+    """
+    db = sqlite3.connect(filename)
+    db.execute("PRAGMA journal_mode = OFF")
+    for table in sh._day_tables(sh.c):
+        db.execute(f"CREATE TABLE {table} (channel text, start integer,"
+                   " stop integer, desc text, primary key(channel, stop))")
+        db.execute(f"CREATE INDEX {table}_channel_start "
+                   f"ON {table} (channel, start, stop, desc)")
+    for row in sh.c.execute("SELECT * FROM program"):
+        db.execute("INSERT OR IGNORE INTO "
+                   f"{sh._day_table(sh._local_day(row[1]))} VALUES (?,?,?,?)", row)
+    db.commit()
+    db.close()
+    return os.path.getsize(filename)
+
+
+def main():
+    sh = open_guide(archive=sys.argv[1] if len(sys.argv) > 1 else None)
+    sh.c.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    rows = sh.c.execute("SELECT count(*) FROM program").fetchone()[0]
+    titles = sh.c.execute("SELECT count(*) FROM title").fetchone()[0]
+    size = os.path.getsize(sh.dbname)
+    inline = inline_size(sh, os.path.join(os.path.dirname(sh.dbname),
+                                          'inline.db'))
+    print(f"{rows} programmes, {titles} distinct titles")
+    print(f"inline titles: {inline / 1024:.0f} KiB")
+    print(f"title table:   {size / 1024:.0f} KiB ({size / inline:.0%})")
+    sh.close()
+
+
+if __name__ == "__main__":
+    main()
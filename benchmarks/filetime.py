@@ -0,0 +1,41 @@
+#! /usr/bin/env python3
+# Copyright (c) 2016-2025 Blaze <blaze@vivaldi.net>
+# Licensed under the GNU General Public License, version 3 or later.
+# See the file http://www.gnu.org/copyleft/gpl.txt.
+
+"""
+    Checks that the NumPy FILETIME conversion matches the pure Python one
+    and compares their speed
+"""
+
+import datetime
+import time
+
+from synthetic import make_channel
+from tvnao import jtv_parser
+
+
+def main():
+    if not jtv_parser.numpy:
+        print("numpy is not installed, nothing to compare")
+        return
+    start = datetime.datetime(2025, 3, 30, 1, 59, 59)
+    channels = [make_channel(1500, start, step=1799)[1] for _ in range(200)]
+    shift = 3 * 3600
+    timings = {}
+    results = {}
+    for name, numpy in (("python", None), ("numpy", jtv_parser.numpy)):
+        jtv_parser.numpy = numpy
+        begin = time.perf_counter()
+        results[name] = [jtv_parser.schedule_records(x, shift) for x in channels]
+        timings[name] = time.perf_counter() - begin
+    assert results["python"] == results["numpy"], "conversions differ"
+    assert all(type(x) is int for x in results["numpy"][0][0])
+    print(f"{len(channels)} channels x 1500 records, results are equal")
+    print(f"python: {timings['python']:.3f}s")
+    print(f"numpy:  {timings['numpy']:.3f}s "
+          f"({timings['python'] / timings['numpy']:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
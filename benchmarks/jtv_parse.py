@@ -0,0 +1,72 @@
+#! /usr/bin/env python3
+# Copyright (c) 2016-2025 Blaze <blaze@vivaldi.net>
+# Licensed under the GNU General Public License, version 3 or later.
+# See the file http://www.gnu.org/copyleft/gpl.txt.
+
+"""
+    Compares the slicing JTV parser with the memoryview one
+    on a synthetic 500-channel archive
+"""
+
+import io
+import struct
+import time
+import zipfile
+
+from synthetic import make_archive
+from tvnao.jtv_parser import parse_titles, parse_schedule
+
+
+def legacy_parse_titles(data: bytes) -> list:
+    data = data[26:]
+    titles = []
+    while len(data) > 0:
+        title_length = int(struct.unpack('<H', data[:2])[0])
+        data = data[2:]
+        try:
+            title = data[:title_length].decode('utf-8')
+        except UnicodeDecodeError:
+            return titles
+        data = data[title_length:]
+        titles.append(title)
+    return titles
+
+
+def legacy_parse_schedule(data: bytes) -> list:
+    schedules = []
+    records_num = struct.unpack('<H', data[0:2])[0]
+    data = data[2:]
+    i = 0
+    while i < records_num:
+        i = i + 1
+        record = data[0:12]
+        data = data[12:]
+        schedules.append(struct.unpack('<Q', record[2:-2])[0])
+    return schedules
+
+
+def run(parse_titles, parse_schedule, members) -> (float, int):
+    count = 0
+    begin = time.perf_counter()
+    for pdt, ndx in members:
+        count += len(parse_titles(pdt)) + len(parse_schedule(ndx))
+    return time.perf_counter() - begin, count
+
+
+def main():
+    buffer = io.BytesIO()
+    make_archive(buffer, channels=500, programmes=1500)
+    with zipfile.ZipFile(buffer) as archive:
+        names = [x[:-4] for x in archive.namelist() if x.endswith('.pdt')]
+        members = [(archive.read(x + '.pdt'), archive.read(x + '.ndx'))
+                   for x in names]
+    legacy, legacy_count = run(legacy_parse_titles, legacy_parse_schedule, members)
+    current, count = run(parse_titles, parse_schedule, members)
+    assert count == legacy_count
+    print(f"{len(members)} channels, {count // 2} records each way")
+    print(f"slicing parser:    {legacy:.3f}s")
+    print(f"memoryview parser: {current:.3f}s ({legacy / current:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#! /usr/bin/env python3
+# Copyright (c) 2016-2025 Blaze <blaze@vivaldi.net>
+# Licensed under the GNU General Public License, version 3 or later.
+# See the file http://www.gnu.org/copyleft/gpl.txt.
+
+"""
+    Compares the per-line re.match playlist parsing, as it was and
+    extended to the attributes the parser gives, with the parser module
+    on a synthetic 50000-line playlist, best of interleaved rounds
+"""
+
+import re
+import time
+
+import synthetic  # noqa: F401, puts the package on the path
+from tvnao.m3u_parser import PlaylistParser
+
+ROUNDS = 10
+
+
+def make_playlist(lines: int = 50000) -> str:
+    playlist = ['#EXTM3U url-tvg="http://localhost/jtv.zip" tvg-shift=0']
+    for i in range((lines - 1) // 2):
+        group = f' group-title="Group {i // 100}"' if i % 100 == 0 else ""
+        playlist.append(f'#EXTINF:-1 tvg-id="channel{i}" tvg-name="Channel {i}"'
+                        f' tvg-logo="http://localhost/logo/{i}.png"{group}'
+                        f' catchup="shift" catchup-days="7",Channel {i} HD')
+        playlist.append(f'udp://239.0.{i // 256}.{i % 256}:1234')
+    return "\n".join(playlist)
+
+
+def legacy_parse(text: str) -> list:
+    guide_addr, counter, entries = "", 0, []
+    playlist = ""
+    for line in text.splitlines(keepends=True):
+        playlist += line
+    for line in playlist.splitlines():
+        if line.startswith('#EXTM3U'):
+            match = re.match(r'.*url-tvg=([^\s,]*).*', line)
+            guide_addr = match.group(1).strip('"') if match else ""
+        elif line.startswith('#EXTINF'):
+            counter += 1
+            name = "{}. {}".format(counter, line.split(',')[1])
+            match = re.match(r'.*tvg-(?:id|name)=([^\s,]*).*', line)
+            id = match.group(1).strip('"') if match else None
+            title = re.match(r'.*group-title=\"?([^\",]*).*', line)
+            if title:
+                entries.append((title.group(1), None, None))
+        elif line.startswith('udp://') or line.startswith('http://')\
+                or line.startswith('file://'):
+            entries.append((name, line, id))
+    return entries
+
+
+def legacy_parse_all(text: str) -> list:
+    entries = []
+    for line in text.splitlines():
+        if line.startswith('#EXTINF'):
+            name = line.split(',')[1]
+            attributes = {}
+            for key in ('tvg-id', 'tvg-name', 'group-title', 'tvg-logo',
+                        'catchup', 'catchup-days', 'catchup-source'):
+                match = re.match(r'.*' + key + r'=\"?([^\",]*).*', line)
+                attributes[key] = match.group(1) if match else ""
+        elif line.startswith('udp://') or line.startswith('http://')\
+                or line.startswith('file://'):
+            entries.append((name, line, attributes))
+    return entries
+
+
+def parse(text: str) -> list:
+    parser, entries, group = PlaylistParser(), [], ""
+    for channel in parser.feed(text.splitlines()):
+        if channel.group and channel.group != group:
+            group = channel.group
+            entries.append((group, None, None))
+        entries.append((f"{channel.number}. {channel.name}", channel.url,
+                        channel.id))
+    return entries
+
+
+def main():
+    text = make_playlist()
+    variants = (('re.match, 3 attributes', legacy_parse),
+                ('re.match, 7 attributes', legacy_parse_all),
+                ('parser module', parse))
+    best, entries = {}, {}
+    for _ in range(ROUNDS):
+        for label, fn in variants:
+            begin = time.perf_counter()
+            entries[label] = fn(text)
+            elapsed = time.perf_counter() - begin
+            best[label] = min(best.get(label, elapsed), elapsed)
+    for label, _ in variants:
+        print(f"{label:23} {best[label] * 1000:7.1f} ms,"
+              f" {len(entries[label])} entries")
+
+
+if __name__ == "__main__":
+    main()
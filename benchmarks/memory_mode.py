@@ -0,0 +1,33 @@
+#! /usr/bin/env python3
+# Copyright (c) 2016-2025 Blaze <blaze@vivaldi.net>
+# Licensed under the GNU General Public License, version 3 or later.
+# See the file http://www.gnu.org/copyleft/gpl.txt.
+
+"""
+    Compares the query latency of the on-disk and the in-memory
+    database on a synthetic 300 channels x 7 days cache
+"""
+
+import datetime
+
+from overview_query import measure
+from synthetic import open_guide
+
+
+def main():
+    open_guide().close()
+    from tvnao.schedule_handler import ScheduleHandler
+    today = datetime.date.today().strftime("%Y%m%d")
+    for memory in (False, True):
+        sh = ScheduleHandler('', memory=memory)
+        full_day = measure(lambda: [sh.get_schedule(today, f'channel{i}', True)
+                                    for i in range(0, 300, 10)], 10) / 30
+        timeshift = measure(lambda: [list(sh.get_timeshift_list(today, f'channel{i}'))
+                                     for i in range(0, 300, 10)], 10) / 30
+        print(f"{'memory' if memory else 'disk':6}  full day: {full_day:.3f} ms"
+              f"  timeshift: {timeshift:.3f} ms")
+        sh.close()
+
+
+if __name__ == "__main__":
+    main()
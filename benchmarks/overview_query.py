@@ -0,0 +1,36 @@
+#! /usr/bin/env python3
+# Copyright (c) 2016-2025 Blaze <blaze@vivaldi.net>
+# Licensed under the GNU General Public License, version 3 or later.
+# See the file http://www.gnu.org/copyleft/gpl.txt.
+
+"""
+    Times the guide queries on a synthetic 300 channels x 7 days cache
+"""
+
+import datetime
+import time
+
+from synthetic import open_guide
+
+
+def measure(fn, repeat: int = 50) -> float:
+    begin = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - begin) / repeat * 1000
+
+
+def main():
+    sh = open_guide()
+    sh.explain()
+    channel_map = {f'channel{i}': f'Channel {i}' for i in range(300)}
+    today = datetime.date.today().strftime("%Y%m%d")
+    print(f"overview:        {measure(lambda: sh.get_overview(channel_map)):.2f} ms")
+    print(f"full day:        {measure(lambda: sh.get_schedule(today, 'channel7', True)):.2f} ms")
+    print(f"current program: {measure(lambda: sh.get_current_program('channel7')):.3f} ms")
+    print(f"full day x300:   {measure(lambda: [sh.get_schedule(today, f'channel{i}', True) for i in range(300)], 5):.1f} ms")
+    print(f"records x300:    {measure(lambda: [sh.programmes(today, f'channel{i}') for i in range(300)], 5):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
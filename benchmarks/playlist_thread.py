@@ -0,0 +1,88 @@
+#! /usr/bin/env python3
+# Copyright (c) 2016-2025 Blaze <blaze@vivaldi.net>
+# Licensed under the GNU General Public License, version 3 or later.
+# See the file http://www.gnu.org/copyleft/gpl.txt.
+
+"""
+    Loads a synthetic 20000 channel playlist through the main window
+    and checks that the worker thread leaves every widget and model
+    call to the GUI thread, timing the first and the last rows shown
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import synthetic  # noqa: F401, puts the package on the path
+from m3u_parse import make_playlist
+
+home = tempfile.mkdtemp(prefix='tvnao-bench-')
+os.environ['HOME'] = os.environ['LOCALAPPDATA'] = home
+os.environ['XDG_CONFIG_HOME'] = os.path.join(home, '.config')
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt6 import QtCore, QtGui, QtWidgets  # noqa: E402
+from tvnao import tvnao  # noqa: E402
+
+CHANNELS = 20000
+TIMEOUT = 60
+
+# calls that must only ever come from the GUI thread
+GUARDED = (
+    (QtGui.QAction, 'setChecked'),
+    (QtWidgets.QWidget, 'setVisible'),
+    (QtWidgets.QLineEdit, 'setPlaceholderText'),
+    (QtCore.QAbstractItemModel, 'beginResetModel'),
+    (QtCore.QAbstractItemModel, 'beginInsertRows'),
+    (tvnao.ChannelModel, 'set_channels'),
+    (tvnao.ChannelModel, 'append_channels'),
+)
+
+
+def guard(cls, name: str, offenders: list) -> None:
+    method = getattr(cls, name)
+
+    def wrapper(self, *args, **kwargs):
+        app = QtWidgets.QApplication.instance()
+        if app and QtCore.QThread.currentThread() is not app.thread():
+            offenders.append(f'{cls.__name__}.{name}')
+        return method(self, *args, **kwargs)
+
+    setattr(cls, name, wrapper)
+
+
+def main():
+    playlist = os.path.join(home, 'list.m3u')
+    with open(playlist, 'w') as f:
+        f.write(make_playlist(CHANNELS * 2 + 1))
+    sys.argv = ['tvnao', playlist]
+    offenders = []
+    for cls, name in GUARDED:
+        guard(cls, name, offenders)
+    app = QtWidgets.QApplication(sys.argv)
+    window = tvnao.MainWindow()
+    window.show()
+    shown = []
+    window.channel_model.modelReset.connect(
+        lambda: shown.append(time.perf_counter()))
+    window.channel_model.rowsInserted.connect(
+        lambda *_: shown.append(time.perf_counter()))
+    begin = time.perf_counter()
+    window.refresh()
+    # the guide worker is started once the playlist one is done
+    while window.sh is None or window.thread_pool.activeThreadCount():
+        assert time.perf_counter() - begin < TIMEOUT, "workers timed out"
+        app.processEvents(QtCore.QEventLoop.ProcessEventsFlag.AllEvents, 50)
+    app.processEvents()
+    print(f"first rows:  {(shown[0] - begin) * 1000:.1f} ms")
+    print(f"all rows:    {(shown[-1] - begin) * 1000:.1f} ms in {len(shown)} parts")
+    print(f"off-thread:  {len(offenders)} {sorted(set(offenders))}")
+    assert not offenders, "GUI calls made off the GUI thread"
+    assert len(window.channel_ids) == CHANNELS
+    assert window.channel_model.rowCount() == CHANNELS + CHANNELS // 100
+    window.quit()
+
+
+if __name__ == "__main__":
+    main()
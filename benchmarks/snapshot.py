@@ -0,0 +1,41 @@
+#! /usr/bin/env python3
+# Copyright (c) 2016-2025 Blaze <blaze@vivaldi.net>
+# Licensed under the GNU General Public License, version 3 or later.
+# See the file http://www.gnu.org/copyleft/gpl.txt.
+
+"""
+    Compares opening and querying the sqlite cache with the
+    memory-mapped snapshot on a synthetic 300 channels x 7 days cache,
+    the first now/next lookup right after opening included
+"""
+
+import datetime
+import time
+
+from overview_query import measure
+from synthetic import open_guide
+
+
+def main():
+    open_guide(snapshot=True).close()
+    from tvnao.schedule_handler import ScheduleHandler
+    today = datetime.date.today().strftime("%Y%m%d")
+    channel_map = {f'channel{i}': f'Channel {i}' for i in range(300)}
+    for snapshot in (False, True):
+        begin = time.perf_counter()
+        sh = ScheduleHandler('', snapshot=snapshot)
+        opened = (time.perf_counter() - begin) * 1000
+        begin = time.perf_counter()
+        sh.current('channel0')
+        first = (time.perf_counter() - begin) * 1000
+        full_day = measure(lambda: [sh.get_schedule(today, f'channel{i}', True)
+                                    for i in range(0, 300, 10)], 10) / 30
+        overview = measure(lambda: sh.get_overview(channel_map), 10)
+        print(f"{'snapshot' if snapshot else 'sqlite':8}  open: {opened:.1f} ms"
+              f"  first now/next: {first:.2f} ms  full day: {full_day:.3f} ms"
+              f"  overview: {overview:.2f} ms")
+        sh.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Copyright (c) 2016-2025 Blaze <blaze@vivaldi.net>
+# Licensed under the GNU General Public License, version 3 or later.
+# See the file http://www.gnu.org/copyleft/gpl.txt.
+
+import os
+import sys
+import shutil
+import struct
+import zipfile
+import datetime
+import tempfile
+from typing import Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from tvnao.jtv_parser import JTV_HEADER, NDX_RECORD  # noqa: E402
+
+FILETIME_EPOCH = datetime.datetime(1601, 1, 1)
+
+
+def to_filetime(time: datetime.datetime) -> int:
+    return (time - FILETIME_EPOCH) // datetime.timedelta(microseconds=1) * 10
+
+
+def make_channel(programmes: int, start: datetime.datetime,
+                 step: int = 1800) -> (bytes, bytes):
+    """
+        Builds a .pdt/.ndx pair with the given number of programmes
+    """
+    pdt, ndx = bytearray(JTV_HEADER), bytearray()
+    ndx += struct.pack('<H', programmes)
+    for i in range(programmes):
+        offset = len(pdt)
+        title = f'Programme {i} — серия {i % 40}'.encode('utf-8')
+        pdt += struct.pack('<H', len(title)) + title
+        time = start + datetime.timedelta(seconds=i * step)
+        ndx += NDX_RECORD.pack(0, to_filetime(time), offset)
+    return bytes(pdt), bytes(ndx)
+
+
+def make_archive(file, channels: int = 500, programmes: int = 336) -> None:
+    """
+        Writes a jtv.zip-like archive with `channels` channels starting today
+    """
+    start = datetime.datetime.combine(datetime.date.today(), datetime.time())
+    with zipfile.ZipFile(file, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for channel in range(channels):
+            pdt, ndx = make_channel(programmes, start)
+            archive.writestr(f'channel{channel}.pdt', pdt)
+            archive.writestr(f'channel{channel}.ndx', ndx)
+
+
+def open_guide(channels: int = 300, programmes: int = 7 * 48,
+               archive: Optional[str] = None, **kwargs):
+    """
+        Points HOME at a new temporary directory, puts a synthetic
+        archive, or a copy of `archive`, in its cache and returns the
+        ScheduleHandler that ingested it, opened with `kwargs`
+    """
+    home = tempfile.mkdtemp(prefix='tvnao-bench-')
+    os.environ['HOME'] = os.environ['LOCALAPPDATA'] = home
+    # the cache is found under HOME as the handler is created
+    from tvnao.schedule_handler import ScheduleHandler
+    cache = os.path.join(home, '.cache', 'tvnao')
+    os.makedirs(cache)
+    jtv_file = os.path.join(cache, ScheduleHandler.jtv_file)
+    if archive:
+        shutil.copy(archive, jtv_file)
+    else:
+        make_archive(jtv_file, channels, programmes)
+    return ScheduleHandler('', **kwargs)
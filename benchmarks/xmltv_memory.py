@@ -0,0 +1,65 @@
+#! /usr/bin/env python3
+# Copyright (c) 2016-2025 Blaze <blaze@vivaldi.net>
+# Licensed under the GNU General Public License, version 3 or later.
+# See the file http://www.gnu.org/copyleft/gpl.txt.
+
+"""
+    Checks with tracemalloc that streaming XMLTV ingest keeps a flat
+    memory peak as the guide grows
+"""
+
+import gzip
+import os
+import tempfile
+import time
+import tracemalloc
+
+import synthetic  # noqa: F401
+from tvnao.xmltv_parser import open_guide, iter_programmes
+
+
+def make_guide(filename: str, channels: int, programmes: int) -> None:
+    with gzip.open(filename, 'wt', encoding='utf-8') as file:
+        file.write('<?xml version="1.0" encoding="UTF-8"?>\n<tv>\n')
+        for channel in range(channels):
+            file.write(f'<channel id="ch{channel}">'
+                       f'<display-name>Channel {channel}</display-name>'
+                       '</channel>\n')
+        for channel in range(channels):
+            for i in range(programmes):
+                start = 1750000000 + i * 1800
+                stamp = lambda x: time.strftime('%Y%m%d%H%M%S +0300',
+                                                time.gmtime(x + 10800))
+                file.write(f'<programme start="{stamp(start)}" '
+                           f'stop="{stamp(start + 1800)}" channel="ch{channel}">'
+                           f'<title lang="ru">Programme {i}</title>'
+                           f'<desc lang="ru">{"description " * 20}</desc>'
+                           '</programme>\n')
+        file.write('</tv>\n')
+
+
+def measure(filename: str) -> (int, int):
+    tracemalloc.start()
+    with open_guide(filename) as file:
+        count = sum(1 for _ in iter_programmes(file))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return count, peak
+
+
+def main():
+    directory = tempfile.mkdtemp(prefix='tvnao-bench-')
+    peaks = []
+    for channels in (50, 500):
+        filename = os.path.join(directory, f'guide{channels}.xml.gz')
+        make_guide(filename, channels, 336)
+        count, peak = measure(filename)
+        peaks.append(peak)
+        print(f"{count} programmes ({os.path.getsize(filename) >> 10} KiB gzipped):"
+              f" peak {peak >> 10} KiB")
+        os.remove(filename)
+    assert peaks[1] < peaks[0] * 2, "memory grows with the guide size"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+# Copyright (c) 2016-2025 Blaze <blaze@vivaldi.net>
+# Licensed under the GNU General Public License, version 3 or later.
+# See the file http://www.gnu.org/copyleft/gpl.txt.
+
+from array import array
+from bisect import bisect_left
+from typing import Iterator, List, Optional, Tuple
+
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, Qt
+from PyQt6.QtGui import QIcon
+
+from .channel_search import ChannelSearch
+
+
+class ChannelList:
+    """
+        Playlist entries as parallel columns, a group title is an entry
+        without an address. Holds no Qt objects so that it can be built
+        off the GUI thread and installed into ChannelModel at once.
+        A playlist loaded in parts is a list following `after`, the
+        part before it, with rows and groups going on from there.
+    """
+
+    def __init__(self, entries: List[Tuple[str, Optional[str], Optional[str]]],
+                 after: Optional['ChannelList'] = None):
+        self.first_row = after.first_row + len(after.names) if after else 0
+        self.names = [x[0] for x in entries]
+        self.urls = [x[1] for x in entries]
+        self.ids = [x[2] for x in entries]
+        self.channel_ids = [id for url, id in zip(self.urls, self.ids)
+                            if url is not None]
+        self.search = ChannelSearch(self.names)
+        # row of the group title every entry falls under, -1 before any
+        self.groups = array('i')
+        group = after.groups[-1] if after and after.groups else -1
+        self.group_rows = []
+        for row, url in enumerate(self.urls, self.first_row):
+            if url is None:
+                group = row
+                self.group_rows.append(row)
+            self.groups.append(group)
+
+
+class ChannelModel(QAbstractListModel):
+    """
+        Shows a ChannelList. UserRole gives (address, id) of a channel
+        and None for a group.
+    """
+
+    def __init__(self, bookmarks: List[str], parent=None):
+        super(ChannelModel, self).__init__(parent)
+        self.bookmarks = bookmarks
+        self.bookmark_icon = QIcon.fromTheme('folder-bookmark')
+        self.channel_icon = QIcon.fromTheme('video-webm')
+        self.set_channels(ChannelList([]))
+
+    def set_channels(self, channels: ChannelList) -> None:
+        """
+            Replaces the entries in a single reset
+        """
+        self.beginResetModel()
+        self.names, self.urls, self.ids = channels.names, channels.urls, channels.ids
+        self.search = channels.search
+        self.groups, self.group_rows = channels.groups, channels.group_rows
+        self.endResetModel()
+
+    def append_channels(self, channels: ChannelList) -> None:
+        """
+            Appends the part of the playlist following the shown one
+        """
+        if not channels.names:
+            return
+        first = len(self.names)
+        self.beginInsertRows(QModelIndex(), first, first + len(channels.names) - 1)
+        self.names += channels.names
+        self.urls += channels.urls
+        self.ids += channels.ids
+        self.search.extend(channels.search)
+        self.groups += channels.groups
+        self.group_rows += channels.group_rows
+        self.endInsertRows()
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.names)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        row = index.row()
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.names[row]
+        if self.urls[row] is None:
+            return None
+        if role == Qt.ItemDataRole.UserRole:
+            return self.urls[row], self.ids[row]
+        if role == Qt.ItemDataRole.DecorationRole:
+            return self.bookmark_icon if self.ids[row] in self.bookmarks\
+                else self.channel_icon
+        return None
+
+    def channels(self) -> Iterator[Tuple[str, str]]:
+        """
+            (name, id) of every channel
+        """
+        return ((name, id) for name, url, id
+                in zip(self.names, self.urls, self.ids) if url is not None)
+
+    def update_row(self, row: int) -> None:
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+
+class ChannelFilterModel(QAbstractListModel):
+    """
+        Hides channels by filter text, folded groups and bookmarks.
+        The shown rows are kept as a list of source rows computed at once
+        from the matches of the search index, while searching they are
+        ranked within their groups. Being a list model rather than a
+        QSortFilterProxyModel or QAbstractProxyModel, neither filtering
+        nor the layout of the view call Python code per playlist row.
+    """
+
+    def __init__(self, parent=None):
+        super(ChannelFilterModel, self).__init__(parent)
+        self.term = ""
+        self.bookmarks_only = False
+        self.folded = set()
+        # whether groups appended later come folded
+        self.fold_new = False
+        # source row of every shown row and the other way round
+        self.rows, self.positions = [], {}
+        self.model = None
+
+    def setSourceModel(self, model: ChannelModel) -> None:
+        self.beginResetModel()
+        self.model = model
+        model.modelAboutToBeReset.connect(self.beginResetModel)
+        model.modelReset.connect(self._reset)
+        model.dataChanged.connect(self._data_changed)
+        model.rowsInserted.connect(self._rows_inserted)
+        self._update_rows()
+        self.endResetModel()
+
+    def _reset(self) -> None:
+        self.folded, self.fold_new = set(), False
+        self._update_rows()
+        self.endResetModel()
+
+    def _data_changed(self, first, last, roles) -> None:
+        for row in range(first.row(), last.row() + 1):
+            if row in self.positions:
+                index = self.index(self.positions[row], 0)
+                self.dataChanged.emit(index, index, roles)
+
+    def _rows_inserted(self, parent, first, last) -> None:
+        if self.fold_new:
+            group_rows = self.model.group_rows
+            self.folded.update(group_rows[bisect_left(group_rows, first):])
+        if self.term or self.bookmarks_only or self.folded:
+            self.refilter()
+            return
+        # everything is shown in playlist order, the rows go at the end
+        shown, rows = len(self.rows), range(first, last + 1)
+        self.beginInsertRows(QModelIndex(), shown, shown + len(rows) - 1)
+        self.rows += rows
+        self.positions.update(zip(rows, range(shown, shown + len(rows))))
+        self.endInsertRows()
+
+    def _filter_rows(self) -> List[int]:
+        model = self.model
+        urls, groups, folded = model.urls, model.groups, self.folded
+        ranks = model.search.find(self.term) if self.term else None
+        if self.bookmarks_only:
+            bookmarks, ids = set(model.bookmarks), model.ids
+            rows = [row for row in (range(len(urls)) if ranks is None else ranks)
+                    if ids[row] in bookmarks]
+        elif ranks is not None:
+            # group titles are searched too, but every one is shown anyway
+            rows = [row for row in ranks
+                    if urls[row] is not None and groups[row] not in folded]
+            rows += model.group_rows
+        elif folded:
+            rows = [row for row, url in enumerate(urls)
+                    if url is None or groups[row] not in folded]
+        else:
+            rows = list(range(len(urls)))
+        # only the matches need sorting, the rest are in playlist order
+        if ranks:
+            if len(set(ranks.values())) == 1:
+                # groups go up with the rows and a group title comes
+                # before its channels, so the row order is the same
+                rows.sort()
+            else:
+                # a group title (rank -1) stays on top of its channels
+                rows.sort(key=lambda x: (groups[x], ranks.get(x, -1), x))
+        return rows
+
+    def _update_rows(self, rows: Optional[List[int]] = None) -> None:
+        if rows is None:
+            rows = self._filter_rows()
+        if rows != self.rows:
+            self.rows = rows
+            self.positions = {row: i for i, row in enumerate(rows)}
+
+    def refilter(self) -> None:
+        """
+            Recomputes the shown rows keeping the current one if it stays.
+            The view is left alone when they are the same.
+        """
+        rows = self._filter_rows()
+        if rows == self.rows:
+            return
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        sources = [self.rows[x.row()] for x in persistent]
+        self._update_rows(rows)
+        self.changePersistentIndexList(persistent, [
+            self.index(self.positions[x], 0) if x in self.positions
+            else QModelIndex() for x in sources])
+        self.layoutChanged.emit()
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        return self.model.data(self.mapToSource(index), role)
+
+    def mapToSource(self, index) -> QModelIndex:
+        if not index.isValid():
+            return QModelIndex()
+        return self.model.index(self.rows[index.row()])
+
+    def mapFromSource(self, index) -> QModelIndex:
+        if not index.isValid() or index.row() not in self.positions:
+            return QModelIndex()
+        return self.index(self.positions[index.row()])
+
+    def set_filter(self, term: str, bookmarks_only: bool) -> None:
+        self.term, self.bookmarks_only, self.folded = term, bookmarks_only, set()
+        self.fold_new = False
+        self.refilter()
+
+    def fold_all(self, folded: bool) -> None:
+        self.bookmarks_only = False
+        # -1 folds the channels listed before the first group too
+        self.folded = {-1} | set(self.model.group_rows)\
+            if folded else set()
+        self.fold_new = folded
+        self.refilter()
+
+    def toggle_group(self, group: int) -> None:
+        self.folded ^= {group}
+        self.refilter()
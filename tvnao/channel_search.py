@@ -0,0 +1,99 @@
+# Copyright (c) 2016-2025 Blaze <blaze@vivaldi.net>
+# Licensed under the GNU General Public License, version 3 or later.
+# See the file http://www.gnu.org/copyleft/gpl.txt.
+
+import unicodedata
+from array import array
+from typing import Dict, List, Optional
+
+# rank of a match, lower comes first
+PREFIX, WORD_PREFIX, SUBSTRING = range(3)
+
+
+def normalize(text: str) -> str:
+    """
+        Case-folds text and drops accents so that 'Cafe' finds 'Café'
+    """
+    return "".join(x for x in unicodedata.normalize('NFKD', text)
+                   if not unicodedata.combining(x)).casefold()
+
+
+class ChannelSearch:
+    """
+        Search index over channel names built once per playlist.
+        A term extending the previous one is only looked for among the
+        previous matches, any other term of three and more characters
+        among the candidates given by a trigram index. The trigram index
+        is built when first needed as typing a term from its first
+        character never does.
+    """
+
+    def __init__(self, names: List[str]):
+        self.names = [normalize(x) for x in names]
+        self.trigrams: Optional[Dict[str, array]] = None
+        self.last_term = None
+        self.last_matches = None
+
+    def _add_trigrams(self, first: int = 0) -> None:
+        for row in range(first, len(self.names)):
+            name = self.names[row]
+            for trigram in {name[i:i + 3] for i in range(len(name) - 2)}:
+                if trigram not in self.trigrams:
+                    self.trigrams[trigram] = array('I')
+                self.trigrams[trigram].append(row)
+
+    def extend(self, other: 'ChannelSearch') -> None:
+        """
+            Appends the names of another index, as of a playlist
+            loaded in parts
+        """
+        first = len(self.names)
+        self.names += other.names
+        if self.trigrams is not None:
+            self._add_trigrams(first)
+        self.last_term = self.last_matches = None
+
+    def _candidates(self, term: str) -> Optional[List[int]]:
+        """
+            Rows that may contain `term`, None meaning all of them
+        """
+        if self.last_term and term.startswith(self.last_term):
+            return list(self.last_matches)
+        if len(term) < 3:
+            return None
+        if self.trigrams is None:
+            self.trigrams = {}
+            self._add_trigrams()
+        postings = []
+        for i in range(len(term) - 2):
+            trigram = term[i:i + 3]
+            if trigram not in self.trigrams:
+                return []
+            postings.append(self.trigrams[trigram])
+        return min(postings, key=len)
+
+    def find(self, term: str) -> Dict[int, int]:
+        """
+            Maps the rows with names containing `term` to the rank of
+            the match: a name prefix, a word prefix or a substring
+        """
+        term = normalize(term)
+        candidates = self._candidates(term)
+        names = self.names
+        if candidates is None:
+            candidates = range(len(names))
+        matches = {}
+        for row in candidates:
+            name = names[row]
+            pos = name.find(term)
+            if pos == 0:
+                matches[row] = PREFIX
+            elif pos > 0:
+                matches[row] = SUBSTRING
+                while pos > 0:
+                    if not name[pos - 1].isalnum():
+                        matches[row] = WORD_PREFIX
+                        break
+                    pos = name.find(term, pos + 1)
+        self.last_term, self.last_matches = term, matches
+        return matches
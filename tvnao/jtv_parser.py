@@ -0,0 +1,149 @@
+# Copyright (c) 2016-2025 Blaze <blaze@vivaldi.net>
+# Licensed under the GNU General Public License, version 3 or later.
+# See the file http://www.gnu.org/copyleft/gpl.txt.
+
+import struct
+import logging
+import zipfile
+from typing import List, Optional, Tuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+JTV_HEADER = b'JTV 3.x TV Program Data\n\n\n'
+NDX_RECORD = struct.Struct('<HQH')
+FILETIME_EPOCH = 11644473600
+if numpy:
+    NDX_DTYPE = numpy.dtype(
+        [('flags', '<u2'), ('filetime', '<u8'), ('offset', '<u2')])
+
+
+def parse_titles(data: bytes) -> List[str]:
+    """
+        Decodes the titles of a .pdt member in file order
+    """
+    titles = []
+    with memoryview(data) as view:
+        size = len(view)
+        pos = len(JTV_HEADER)
+        while pos + 2 <= size:
+            title_length = view[pos] | view[pos + 1] << 8
+            pos += 2
+            try:
+                title = str(view[pos:pos + title_length], 'utf-8')
+            except UnicodeDecodeError:
+                break
+            pos += title_length
+            titles.append(title)
+    return titles
+
+
+def parse_schedule(data: bytes) -> List[Tuple[int, int, int]]:
+    """
+        Unpacks the 12-byte .ndx records into (flags, filetime, offset)
+    """
+    with memoryview(data) as view:
+        records_num = struct.unpack_from('<H', view)[0]
+        records_num = min(records_num, (len(view) - 2) // NDX_RECORD.size)
+        return list(NDX_RECORD.iter_unpack(
+            view[2:2 + records_num * NDX_RECORD.size]))
+
+
+def filetime_to_epoch(filetime: int, shift: int = 0) -> int:
+    """
+        Converts FILETIME to epoch seconds, `shift` is added in seconds
+    """
+    return filetime // 10000000 - FILETIME_EPOCH + shift
+
+
+def schedule_records(data: bytes,
+                     shift: int = 0) -> Tuple[List[int], List[int]]:
+    """
+        Converts all the .ndx records of a channel to epoch seconds and
+        .pdt title offsets, vectorized with NumPy when it is available
+    """
+    if not numpy:
+        records = parse_schedule(data)
+        return ([filetime_to_epoch(filetime, shift) for _, filetime, _ in records],
+                [offset for _, _, offset in records])
+    records_num = struct.unpack_from('<H', data)[0]
+    records_num = min(records_num, (len(data) - 2) // NDX_DTYPE.itemsize)
+    records = numpy.frombuffer(data, NDX_DTYPE, records_num, 2)
+    epochs = (records['filetime'] // 10000000).astype(numpy.int64)
+    epochs += shift - FILETIME_EPOCH
+    return epochs.tolist(), records['offset'].tolist()
+
+
+def read_title(view: memoryview, offset: int) -> Optional[str]:
+    """
+        Decodes the length-prefixed .pdt title found at `offset`
+    """
+    if offset < len(JTV_HEADER) or offset + 2 > len(view):
+        return None
+    title_length = view[offset] | view[offset + 1] << 8
+    try:
+        return str(view[offset + 2:offset + 2 + title_length], 'utf-8')
+    except UnicodeDecodeError:
+        return None
+
+
+def channel_members(archive: zipfile.ZipFile) -> List[Tuple[str, str]]:
+    """
+        Lists (channel_id, member name without extension) of an archive
+    """
+    members = []
+    for filename in archive.namelist():
+        if filename.endswith(".pdt"):
+            try:
+                unicode_name = bytes(filename, 'cp437').decode('cp866')
+            except ValueError:
+                unicode_name = filename
+            channel_id = unicode_name[0:-4]
+            if not channel_id.isdigit():
+                members.append((channel_id, filename[0:-4]))
+    return members
+
+
+def read_channel(archive: zipfile.ZipFile, channel_id: str, name: str,
+                 shift: int, since: int) -> List[tuple]:
+    """
+        Decodes a .pdt/.ndx pair into program rows starting from `since`,
+        the times are epoch seconds shifted by `shift` seconds.
+        Only the titles referenced by those rows are decoded, each
+        title offset once.
+    """
+    titles = archive.read(name + ".pdt")
+    if not titles.startswith(JTV_HEADER):
+        logging.warning("invalid JTV format")
+        return []
+    starts, offsets = schedule_records(archive.read(name + ".ndx"), shift)
+    rows, cache, positional = [], {}, None
+    with memoryview(titles) as view:
+        for i in range(len(starts) - 1):
+            if starts[i] < since:
+                continue
+            offset = offsets[i]
+            if offset not in cache:
+                cache[offset] = read_title(view, offset)
+            title = cache[offset]
+            if title is None:
+                # broken offset, fall back to pairing titles by position
+                if positional is None:
+                    positional = parse_titles(titles)
+                title = positional[i] if i < len(positional) else None
+            if title is not None:
+                rows.append((channel_id, starts[i], starts[i+1], title))
+    return rows
+
+
+def read_channels(jtv_file: str, members: List[Tuple[str, str]],
+                  shift: int, since: int) -> List[List[tuple]]:
+    """
+        Decodes a batch of channels, opening the archive on its own
+        so that it can run in a worker process
+    """
+    with zipfile.ZipFile(jtv_file, 'r') as archive:
+        return [read_channel(archive, channel_id, name, shift, since)
+                for channel_id, name in members]
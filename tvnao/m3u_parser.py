@@ -0,0 +1,154 @@
+# Copyright (c) 2016-2025 Blaze <blaze@vivaldi.net>
+# Licensed under the GNU General Public License, version 3 or later.
+# See the file http://www.gnu.org/copyleft/gpl.txt.
+
+import re
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+# an attribute, quoted or bare. Starting with a literal blank lets
+# the search jump from blank to blank.
+ATTRIBUTE = re.compile(r' ([\w-]+)=(?:"([^"]*)"|([^\s,"]*))')
+BARE_VALUE = re.compile(r'[^\s,"]*')
+
+
+def attributes_end(line: str) -> int:
+    """
+        Position of the comma ending the attributes of an #EXTM3U or
+        #EXTINF line, the first one outside the quotes, or the length
+        of the line if there is no title
+    """
+    first = end = line.find(',')
+    while end >= 0 and line.count('"', 0, end) % 2:
+        end = line.find(',', end + 1)
+    if end < 0 and line.count('"') % 2:
+        # a quote left open, the first comma is taken then
+        end = first
+    return len(line) if end < 0 else end
+
+
+def parse_attributes(line: str) -> Tuple[Dict[str, str], str]:
+    """
+        Splits an #EXTM3U or #EXTINF line into its attributes and title
+    """
+    end = attributes_end(line)
+    return {key: quoted or bare for key, quoted, bare
+            in ATTRIBUTE.findall(line, 0, end)}, line[end + 1:].strip()
+
+
+def find_attribute(line: str, token: str, end: int) -> Tuple[int, str]:
+    """
+        Position and value of the last attribute given as `token`, its
+        key written out as ' key=', before `end`. -1 and an empty value
+        if there is none, the other attributes are not parsed.
+    """
+    pos = line.rfind(token, 0, end)
+    while pos >= 0 and line.count('"', 0, pos) % 2:
+        pos = line.rfind(token, 0, pos)
+    if pos < 0:
+        return pos, ""
+    start = pos + len(token)
+    value = line[start:end]
+    if value[:1] == '"':
+        value, quote, _ = value[1:].partition('"')
+        if quote:
+            return pos, value
+    return pos, BARE_VALUE.match(line, start, end).group()
+
+
+def _attribute(key: str) -> property:
+    return property(lambda self: self.attributes.get(key, ""),
+                    doc=f"The {key} attribute, empty if not given")
+
+
+class Channel:
+    """
+        A playlist entry with the attributes tvnao makes use of. The ones
+        listing the channel takes are looked up as it is read, the line
+        is parsed for the others when one of them is first asked for.
+    """
+    __slots__ = ('number', 'name', 'url', 'line', 'group', 'id',
+                 '_attributes')
+
+    tvg_id = _attribute('tvg-id')
+    tvg_name = _attribute('tvg-name')
+    logo = _attribute('tvg-logo')
+    catchup = _attribute('catchup')
+    catchup_days = _attribute('catchup-days')
+    catchup_source = _attribute('catchup-source')
+
+    def __init__(self, number: int, url: str, line: str, group: str = ""):
+        end = attributes_end(line)
+        self.number = number
+        self.name = line[end + 1:].strip()
+        self.url = url
+        self.line = line
+        pos, title = find_attribute(line, ' group-title=', end)
+        self.group = title if pos >= 0 else group
+        # the guide id is whichever of the two comes last in the line,
+        # the bookmarks and the guide mappings are saved under it. The
+        # other one is only looked up when that one is left empty.
+        first, last = ' tvg-id=', ' tvg-name='
+        if line.rfind(first, 0, end) > line.rfind(last, 0, end):
+            first, last = last, first
+        self.id: Optional[str] = (find_attribute(line, last, end)[1] or
+                                  find_attribute(line, first, end)[1] or None)
+        self._attributes = None
+
+    @property
+    def attributes(self) -> Dict[str, str]:
+        """
+            Every attribute of the #EXTINF line
+        """
+        if self._attributes is None:
+            self._attributes = parse_attributes(self.line)[0]
+        return self._attributes
+
+    def __repr__(self) -> str:
+        return f'Channel({self.number}, {self.name!r}, {self.url!r})'
+
+
+class PlaylistParser:
+    """
+        Parses M3U/M3U8 playlists line by line. The numbering goes on
+        across the playlists fed to the same parser and the guide
+        address is taken from the first header giving one.
+    """
+
+    def __init__(self):
+        self.guide_addr = ""
+        self.number = 0
+
+    def feed(self, lines: Iterable[str]) -> Iterator[Channel]:
+        """
+            Yields the channels of the given playlist lines
+        """
+        info, group = None, ""
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            if line[0] != '#':
+                if info is not None:
+                    yield Channel(self.number, line, info, group)
+                    info, group = None, ""
+            elif line.startswith('#EXTINF'):
+                self.number += 1
+                info = line
+            elif line.startswith('#EXTGRP:'):
+                group = line[8:].strip()
+            elif line.startswith('#EXTM3U'):
+                if not self.guide_addr:
+                    header, _ = parse_attributes(line)
+                    # the first one of a comma-separated list
+                    self.guide_addr = (header.get('url-tvg') or header.get(
+                        'x-tvg-url', "")).split(',')[0].strip()
+
+
+def guide_address(lines: Iterable[str]) -> str:
+    """
+        Guide address given in the header of a playlist
+    """
+    parser = PlaylistParser()
+    # the header comes before the first channel
+    next(parser.feed(lines), None)
+    return parser.guide_addr
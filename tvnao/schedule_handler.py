@@ -3,47 +3,340 @@
 # See the file http://www.gnu.org/copyleft/gpl.txt.
 
 import os
-import struct
+import calendar
 import datetime
+import glob
+import hashlib
+import shutil
 import sqlite3
+import tempfile
 import zipfile
 import logging
+import threading
+import time
+from contextlib import closing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.client import HTTPException
+from itertools import chain, repeat
+from typing import Callable, List, Optional, Tuple
 from urllib import request, error
-from typing import List
 import encodings.idna
 
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+from .jtv_parser import channel_members, read_channel, read_channels
+from .schedule_index import ScheduleIndex
+from .schedule_records import Listing, Programme
+from .schedule_render import cut, current_text, overview_html, schedule_html
+from .schedule_snapshot import ScheduleSnapshot, write_snapshot
+from .xmltv_parser import GZIP_MAGIC, open_guide, iter_programmes
+
 
 class ScheduleHandler:
     dbname = 'schedule.db'
     jtv_file = 'jtv.zip'
-    db = None
+    xmltv_file = 'guide.xmltv'
+    snapname = 'schedule.snap'
+    guide_types = ('application/zip', 'application/x-zip-compressed',
+                   'application/gzip', 'application/x-gzip',
+                   'application/xml', 'text/xml', 'application/octet-stream')
+    batch_size = 1000
+    commit_every = 50
+    # the head of the priority list ingested and committed one by one
+    eager_channels = 32
+    chunk_size = 1 << 16
+    connect_timeout = 15
+    read_timeout = 60
+    # seconds between attempts to take the ingest lock
+    lock_interval = 0.5
+    source = None
+    wname = None
+    generation = 0
+    progress = None
+    schema_version = 8
+    index = None
+    tables = None
+    view_changed = False
+    title_ids = None
+    queries = {
+        'index': "SELECT channel, start, stop, desc FROM program "
+                 "WHERE stop > :now ORDER BY channel, start",
+        'upcoming': "SELECT channel, start, stop, desc FROM program "
+                    "WHERE channel = :channel AND stop > :now ORDER BY start",
+        'day': "SELECT start, stop, desc FROM program "
+               "WHERE channel = :channel AND stop > :begin AND start < :end",
+        'timeshift': "SELECT start, stop, desc FROM program "
+                     "WHERE channel = :channel AND stop > :begin "
+                     "AND start < :end AND start < :now",
+        'snapshot': "SELECT channel, start, stop, desc FROM program "
+                    "ORDER BY channel, start",
+    }
+    # the journal mode stays WAL during an ingest, so that readers of
+    # a database ingested in place are not blocked by the writer
+    bulk_pragmas = (
+        "PRAGMA synchronous = OFF",
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA cache_size = -65536",
+    )
+    default_pragmas = (
+        "PRAGMA journal_mode = WAL",
+        "PRAGMA synchronous = NORMAL",
+    )
+    db_suffixes = ("", "-journal", "-wal", "-shm")
 
     def __init__(self, schedule_addr: str,
                  offset: float = 0.0,
                  cached_days_num: int = 5,
-                 tz: datetime.tzinfo = None):
+                 tz: datetime.tzinfo = None,
+                 workers: int = 0,
+                 priority: List[str] = None,
+                 refresh: bool = True,
+                 memory: bool = False,
+                 snapshot: bool = False):
         if cached_days_num < 0:
             raise ValueError("The number of cached days shouldn't be negative")
         self.schedule_addr = schedule_addr
         self.offset = offset
         self.cached_days_num = cached_days_num
         self.tz = tz
+        self.workers = workers
+        self.memory = memory
+        self.snapshot = snapshot
+        self.priority = {x: i for i, x in enumerate(priority or [])}
+        self.offsets = {}
+        self.local = threading.local()
+        self.connections = []
+        self.lock = threading.Lock()
         self._set_prefix()
-        self.db = sqlite3.connect(self.dbname, check_same_thread=False)
-        self.c = self.db.cursor()
-        refill = False
-        if not os.path.getsize(self.dbname):
+        self.open()
+        if refresh:
+            self.refresh()
+
+    def open(self) -> 'ScheduleHandler':
+        """
+            Opens the cached database and indexes it, without touching
+            the network, so that the cached guide can be queried right away.
+            In memory mode the queries are then served from a copy in RAM.
+            What an interrupted ingest left behind is only cleaned up
+            when no other handler is ingesting.
+        """
+        lock = self._lock(blocking=False)
+        try:
+            self._open(cleanup=lock is not None)
+        finally:
+            self._unlock(lock)
+        return self
+
+    def _open(self, cleanup: bool) -> None:
+        self.close()
+        self.source = self.dbname
+        if cleanup:
+            self._remove_shadows()
+        self.refill = False
+        if not os.path.exists(self.dbname) or not os.path.getsize(self.dbname):
             self._create_database()
-            refill = os.path.exists(self.jtv_file)
-        dirty_flag = os.path.exists(self.dbname + "-journal")
-        if self._download_file(self.schedule_addr, self.jtv_file)\
-                or refill or dirty_flag:
-            if dirty_flag or not refill:
+            self.refill = os.path.exists(self._guide_file())
+        else:
+            self._migrate_database()
+        if cleanup and os.path.exists(self.dbname + "-ingest"):
+            self._discard_ingest()
+        for pragma in self.default_pragmas:
+            self.c.execute(pragma)
+        if self.memory:
+            self._load_memory()
+        self._build_index()
+
+    def _lock(self, blocking: bool = True):
+        """
+            Takes the lock held through an ingest by the handlers of all
+            the processes. Returns the locked file, or None if another
+            handler holds it and `blocking` is not set.
+        """
+        file = open(self.dbname + "-lock", 'a')
+        while True:
+            try:
+                if os.name == 'nt':
+                    msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+                else:
+                    fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return file
+            except OSError:
+                if not blocking:
+                    file.close()
+                    return None
+                time.sleep(self.lock_interval)
+
+    def _unlock(self, file) -> None:
+        if file is None:
+            return
+        if os.name == 'nt':
+            msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+        file.close()
+
+    def _discard_ingest(self) -> None:
+        """
+            Empties the database an ingest was interrupted in, to be
+            refilled. It is emptied in place, other processes may have
+            it open.
+        """
+        logging.warning(f'discarding interrupted ingest into {self.dbname}')
+        self._create_view(self.c, [])
+        for table in self._day_tables(self.c):
+            self.c.execute(f"DROP TABLE {table}")
+        self.c.execute("DELETE FROM title")
+        self.c.execute("DELETE FROM member")
+        self._bump_revision(self.c)
+        self.db.commit()
+        os.remove(self.dbname + "-ingest")
+        self.refill = os.path.exists(self._guide_file())
+
+    def _load_memory(self) -> None:
+        """
+            Makes every thread serve its queries from a private copy
+            of the database in RAM, loaded on its next query. Copies
+            share no cache, so a reader never waits on a table lock.
+        """
+        self.source = ":memory:"
+        self.generation += 1
+        logging.info(f'serving {self.dbname} from memory')
+
+    def refresh(self, progress: Callable[[int, int, int], None] = None) -> None:
+        """
+            Downloads the guide and ingests it when it has changed.
+            A database with a guide in it keeps serving queries while
+            a copy of it is updated, the copy is then swapped in at once.
+            An empty or broken one is ingested into directly, and so is
+            the one on disk in memory mode, the threads then load fresh
+            copies of it into RAM.
+            The ingest commits in chunks, `progress` is called after every
+            commit with the number of channels done, the total (0 if
+            unknown) and the number of rows written.
+            Handlers ingest one at a time, a handler finding another one
+            ingesting waits for it and takes in its result.
+        """
+        lock = self._lock(blocking=False)
+        try:
+            if lock is None:
+                logging.info(f'waiting for another ingest into {self.dbname}')
+                lock = self._lock()
+                self._take_over()
+            self._refresh(progress)
+        finally:
+            self._unlock(lock)
+
+    def _take_over(self) -> None:
+        """
+            Takes in what another handler has ingested while this one
+            waited for the lock, or cleans up after it if interrupted
+        """
+        self.refill = False
+        self._remove_shadows()
+        if os.path.exists(self.dbname + "-ingest"):
+            self._discard_ingest()
+        if self.memory:
+            self._load_memory()
+        self._build_index(rewrite=True)
+
+    def _refresh(self, progress: Callable[[int, int, int], None]) -> None:
+        self.progress = progress
+        # an interrupted ingest leaves its -ingest marker behind, the
+        # next handler taking the lock empties the database to refill
+        if not (self._download_file(self.schedule_addr) or self.refill):
+            return
+        shadow = bool(self._day_tables(self.c)) and not self.refill and\
+            not self.memory
+        self.wname = self.dbname
+        if shadow:
+            # a file of its own, never one a handler gone before left
+            fd, self.wname = tempfile.mkstemp(
+                prefix=os.path.basename(self.dbname) + "-shadow-",
+                dir=os.path.dirname(self.dbname) or None)
+            os.close(fd)
+        self.wdb = sqlite3.connect(self.wname, check_same_thread=False)
+        self.w = self.wdb.cursor()
+        try:
+            if shadow:
+                self.db.backup(self.wdb)
+            if not self.refill:
                 self._flush_database()
             self._add_to_database()
+            if shadow:
+                logging.info(f'swapping in the updated {self.dbname}')
+                self.wdb.backup(self.db)
+            self.refill = False
+        finally:
+            self.wdb.close()
+            if shadow:
+                self._remove_database(self.wname)
+            if self.memory:
+                self._load_memory()
+            self._build_index(rewrite=True)
+
+    def _remove_database(self, filename: str) -> None:
+        for suffix in self.db_suffixes:
+            if os.path.exists(filename + suffix):
+                os.remove(filename + suffix)
+
+    def _remove_shadows(self) -> None:
+        """
+            Removes the shadow copies of refreshes that were interrupted,
+            to be called holding the ingest lock
+        """
+        for filename in glob.glob(glob.escape(self.dbname) + "-shadow-*"):
+            os.remove(filename)
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        """
+            Connection of the calling thread, opened on its first query.
+            With WAL, readers on their own connections neither block nor
+            are blocked by the ingest writer. In memory mode a thread
+            swaps in a fresh copy on its first query after a refresh.
+        """
+        db = getattr(self.local, 'db', None)
+        if db is None or self.local.generation != self.generation:
+            fresh = self._connect()
+            with self.lock:
+                if db is not None:
+                    self.connections.remove(db)
+                    db.close()
+                self.connections.append(fresh)
+            self.local.db, self.local.generation = fresh, self.generation
+            db = fresh
+        return db
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.source != ":memory:":
+            return sqlite3.connect(self.source, check_same_thread=False)
+        db = sqlite3.connect(self.source, check_same_thread=False)
+        with closing(sqlite3.connect(self.dbname)) as disk:
+            disk.backup(db)
+        return db
+
+    @property
+    def c(self) -> sqlite3.Cursor:
+        """
+            A fresh cursor on the connection of the calling thread
+        """
+        return self.db.cursor()
 
     def __del__(self):
-        self.db.close()
+        if hasattr(self, 'lock'):
+            self.close()
+
+    def close(self) -> None:
+        """
+            Closes the connections of all the threads
+        """
+        with self.lock:
+            for db in self.connections:
+                db.close()
+            self.connections.clear()
+        self.local = threading.local()
 
     def _set_prefix(self) -> None:
         prefix = ""
@@ -55,202 +348,736 @@ class ScheduleHandler:
             os.makedirs(prefix)
         self.dbname = prefix + self.dbname
         self.jtv_file = prefix + self.jtv_file
+        self.xmltv_file = prefix + self.xmltv_file
+        self.snapname = prefix + self.snapname
 
-    def _download_file(self, link: str, filename: str) -> bool:
+    def _guide_file(self) -> str:
+        """
+            Path of the downloaded guide, either JTV or XMLTV
+        """
+        return self.xmltv_file if os.path.exists(self.xmltv_file)\
+            else self.jtv_file
+
+    def _read_validators(self, filename: str) -> List[str]:
+        """
+            Reads the Last-Modified and ETag values saved for a download
+        """
+        if not os.path.exists(filename):
+            return ['', '']
+        with open(filename, 'r') as file:
+            return (file.read().splitlines() + ['', ''])[:2]
+
+    def _write_validators(self, filename: str, modified: str, etag: str) -> None:
+        with open(filename, 'w') as file:
+            file.write(f'{modified}\n{etag}')
+
+    def _set_read_timeout(self, response) -> None:
+        # urlopen applies a single timeout to both connecting and reading,
+        # the socket of the response is only reachable through its buffer
+        sock = getattr(getattr(response.fp, 'raw', None), '_sock', None)
+        if sock:
+            sock.settimeout(self.read_timeout)
+
+    def _download_file(self, link: str) -> bool:
+        """
+            Downloads the guide into a temporary file, resuming an
+            interrupted download if there is one, and moves it in place
+            once it is complete. Returns whether a new guide has arrived.
+        """
         if not link:
             return False
         logging.info(f'downloading file {link}')
+        jtv_check_file = self.jtv_file.rsplit('.', maxsplit=1)[0]
+        part_file = jtv_check_file + '.part'
+        modified, etag = self._read_validators(jtv_check_file)
+        part_modified, part_etag = self._read_validators(part_file + '.meta')
+        resume_from = os.path.getsize(part_file) \
+            if os.path.exists(part_file) else 0
+        request_headers = {}
+        if resume_from and (part_etag or part_modified):
+            request_headers['Range'] = f'bytes={resume_from}-'
+            request_headers['If-Range'] = part_etag or part_modified
+        elif os.path.exists(self._guide_file()):
+            if modified:
+                request_headers['If-Modified-Since'] = modified
+            if etag:
+                request_headers['If-None-Match'] = etag
         try:
-            response = request.urlopen(link)
+            response = request.urlopen(
+                request.Request(link, headers=request_headers),
+                timeout=self.connect_timeout)
+        except error.HTTPError as e:
+            if e.code == 304:
+                logging.info(f'{self._guide_file()} is up to date')
+            elif e.code == 416 and resume_from:
+                os.remove(part_file)
+                return self._download_file(link)
+            else:
+                logging.error(f"Connection error: {e.code} {e.reason}")
+            return False
         except error.URLError as e:
             logging.error("Connection error: {}".format(str(e.reason)))
             return False
         except ValueError as e:
             logging.error("Connection error: {}".format(str(e)))
             return False
-        headers = dict(response.getheaders())
-        if headers['Content-Type'] != 'application/zip':
-            return False
-        modified = headers['Last-Modified']
-        jtv_check_file = filename.rsplit('.', maxsplit=1)[0]
-        if os.path.exists(jtv_check_file):
-            with open(jtv_check_file, 'r') as file:
-                if file.read() == modified and os.path.exists(self.jtv_file):
-                    logging.info(f'{filename} is up to date')
+        with response:
+            headers = response.headers
+            content_type = headers.get('Content-Type', '').split(';')[0].strip()
+            if content_type not in self.guide_types:
+                return False
+            resumed = response.status == 206
+            if not resumed:
+                modified = headers.get('Last-Modified', '')
+                etag = headers.get('ETag', '')
+                if (modified, etag) == tuple(self._read_validators(jtv_check_file))\
+                        and modified and os.path.exists(self._guide_file()):
+                    logging.info(f'{self._guide_file()} is up to date')
                     return False
-        with open(jtv_check_file, 'w') as file:
-            file.write(modified)
-        with open(filename, 'wb') as file:
-            file.write(response.read())
-        if os.path.getsize(filename) < int(headers['Content-Length']):
+                self._write_validators(part_file + '.meta', modified, etag)
+                expected_size = int(headers.get('Content-Length', 0))
+            else:
+                modified, etag = part_modified, part_etag
+                expected_size = int(headers.get('Content-Range', '/0')
+                                    .rsplit('/', maxsplit=1)[-1].strip('*') or 0)
+            self._set_read_timeout(response)
+            try:
+                with open(part_file, 'ab' if resumed else 'wb') as file:
+                    shutil.copyfileobj(response, file, self.chunk_size)
+            except (OSError, HTTPException) as e:
+                logging.error(f'Download interrupted: {e}')
+                return False
+        if os.path.getsize(part_file) < expected_size:
             logging.error("Wrong file size")
-            os.remove(jtv_check_file)
             return False
+        with open(part_file, 'rb') as file:
+            magic = file.read(512)
+        if magic.startswith(b'PK\x03\x04'):
+            filename, stale = self.jtv_file, self.xmltv_file
+        elif magic.startswith(GZIP_MAGIC) or magic.lstrip().startswith(b'<'):
+            filename, stale = self.xmltv_file, self.jtv_file
+        else:
+            logging.error("Unknown guide format")
+            os.remove(part_file)
+            return False
+        os.replace(part_file, filename)
+        os.remove(part_file + '.meta')
+        if os.path.exists(stale):
+            os.remove(stale)
+        self._write_validators(jtv_check_file, modified, etag)
         return True
 
     def _create_database(self) -> None:
         logging.info(f'creating database {self.dbname}')
-        self.c.execute("CREATE TABLE program "
-                       "(channel text, start integer, stop integer, desc text,"
-                       " primary key(channel, stop))")
+        self.c.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self._create_title_table()
+        self._create_view(self.c, [])
+        self._create_member_table()
+        self._create_meta_table()
+        self.c.execute(f"PRAGMA user_version = {self.schema_version}")
         self.db.commit()
 
-    def _parse_titles(self, data: bytes) -> List[str]:
-        data = data[26:]
-        titles = []
-        while len(data) > 0:
-            title_length = int(struct.unpack('<H', data[:2])[0])
-            data = data[2:]
-            try:
-                title = data[:title_length].decode('utf-8')
-            except UnicodeDecodeError:
-                return titles
-            data = data[title_length:]
-            titles.append(title)
-        return titles
-
-    def _filetime_to_datetime(self, time: bytes) -> datetime.datetime:
-        filetime = struct.unpack('<Q', time)[0]
-        timestamp = filetime/10 + self.offset*3.6e9
-        return datetime.datetime(1601, 1, 1)\
-            + datetime.timedelta(microseconds=timestamp)
-
-    def _parse_schedule(self, data: bytes) -> List[datetime.datetime]:
-        schedules = []
-        records_num = struct.unpack('<H', data[0:2])[0]
-        data = data[2:]
-        i = 0
-        while i < records_num:
-            i = i + 1
-            record = data[0:12]
-            data = data[12:]
-            schedules.append(self._filetime_to_datetime(record[2:-2]))
-        return schedules
+    def _create_member_table(self) -> None:
+        self.c.execute("CREATE TABLE IF NOT EXISTS member "
+                       "(name text primary key, channel text,"
+                       " crc integer, size integer)")
+
+    def _create_meta_table(self) -> None:
+        self.c.execute("CREATE TABLE IF NOT EXISTS meta "
+                       "(key text primary key, value integer)")
+        self.c.execute("INSERT OR IGNORE INTO meta VALUES ('revision', 0)")
+
+    @staticmethod
+    def _bump_revision(cursor: sqlite3.Cursor) -> None:
+        """
+            Counts a change of the programmes, committed along with it
+        """
+        cursor.execute("UPDATE meta SET value = value + 1 "
+                       "WHERE key = 'revision'")
+
+    def _revision(self) -> int:
+        return self.c.execute(
+            "SELECT value FROM meta WHERE key = 'revision'").fetchone()[0]
+
+    def _create_title_table(self) -> None:
+        self.c.execute("CREATE TABLE IF NOT EXISTS title "
+                       "(id integer primary key, desc text)")
+
+    def _create_indexes(self, cursor: sqlite3.Cursor, table: str = 'program',
+                        text: str = 'desc') -> None:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {table}_start "
+                       f"ON {table} (start, stop)")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {table}_channel_start "
+                       f"ON {table} (channel, start, stop, {text})")
+
+    @staticmethod
+    def _title_id(desc: str) -> int:
+        """
+            64-bit hash of a title, used as its key in the title table
+        """
+        return int.from_bytes(hashlib.blake2b(
+            desc.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+    def _local_day(self, timestamp: int) -> int:
+        return (timestamp + self._utc_offset(timestamp)) // 86400
+
+    def _day_table(self, day: int) -> str:
+        """
+            Name of the table holding the programmes starting on
+            the local `day` counted from the epoch
+        """
+        return time.strftime('program_%Y%m%d', time.gmtime(day * 86400))
+
+    def _day_tables(self, cursor: sqlite3.Cursor) -> List[str]:
+        return [x for x, in cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' "
+            "AND name GLOB 'program_[0-9]*' ORDER BY name")]
+
+    def _create_day_table(self, cursor: sqlite3.Cursor, table: str) -> None:
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} "
+                       "(channel text, start integer, stop integer,"
+                       " title integer, primary key(channel, stop))")
+        # every query looks the programmes up by channel, the time range
+        # index of the single program table is left out
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {table}_channel_start "
+                       f"ON {table} (channel, start, stop, title)")
+
+    def _create_view(self, cursor: sqlite3.Cursor, tables: List[str]) -> None:
+        """
+            Puts the day tables together with their titles as
+            the `program` view the queries read from
+        """
+        select = " UNION ALL ".join(f"SELECT * FROM {x}" for x in tables)
+        cursor.execute("DROP VIEW IF EXISTS program")
+        cursor.execute(
+            "CREATE VIEW program AS SELECT p.channel, p.start, p.stop, t.desc "
+            f"FROM ({select}) AS p JOIN title AS t ON t.id = p.title"
+            if select else "CREATE VIEW program AS SELECT '' AS channel, "
+            "0 AS start, 0 AS stop, '' AS desc WHERE 0")
+
+    def _delete_orphan_titles(self, tables: List[str]) -> None:
+        select = " UNION ALL ".join(f"SELECT title FROM {x}" for x in tables)
+        self.w.execute(f"DELETE FROM title WHERE id NOT IN ({select})"
+                       if select else "DELETE FROM title")
+
+    def _migrate_database(self) -> None:
+        """
+            Upgrades the schema of an existing database step by step
+        """
+        version = self.c.execute("PRAGMA user_version").fetchone()[0]
+        for step in range(version + 1, self.schema_version + 1):
+            logging.info(f'migrating database {self.dbname} to version {step}')
+            getattr(self, f'_migrate_v{step}')()
+            self.c.execute(f"PRAGMA user_version = {step}")
+            self.db.commit()
+
+    def _migrate_v1(self) -> None:
+        """
+            Converts YYYYmmddHHMMSS local times into epoch seconds
+        """
+        self.db.create_function('local_epoch', 1, self._to_epoch,
+                                deterministic=True)
+        to_epoch = lambda x: (
+            f"local_epoch(CAST(strftime('%s', substr({x}, 1, 4) || '-'"
+            f" || substr({x}, 5, 2) || '-' || substr({x}, 7, 2) || ' '"
+            f" || substr({x}, 9, 2) || ':' || substr({x}, 11, 2) || ':'"
+            f" || substr({x}, 13, 2)) AS INTEGER))")
+        self.c.execute(f"UPDATE program SET start = {to_epoch('start')}, "
+                       f"stop = {to_epoch('stop')}")
+
+    def _migrate_v2(self) -> None:
+        """
+            Adds the time range indexes
+        """
+        self._create_indexes(self.c)
+        self.c.execute("ANALYZE")
+
+    def _migrate_v3(self) -> None:
+        """
+            Adds the table of archive member checksums
+        """
+        self._create_member_table()
+
+    def _migrate_v4(self) -> None:
+        """
+            Splits the programmes into day tables behind a view and
+            turns on incremental vacuuming
+        """
+        self.db.create_function('local_day', 1, self._local_day,
+                                deterministic=True)
+        days = [x for x, in self.c.execute(
+            "SELECT DISTINCT local_day(start) FROM program ORDER BY 1")]
+        tables = [self._day_table(x) for x in days]
+        for day, table in zip(days, tables):
+            # the layout of version 4, titles moved out in version 5
+            self.c.execute(f"CREATE TABLE {table} "
+                           "(channel text, start integer, stop integer,"
+                           " desc text, primary key(channel, stop))")
+            self._create_indexes(self.c, table)
+            self.c.execute(f"INSERT OR IGNORE INTO {table} "
+                           "SELECT * FROM program WHERE local_day(start) = ?",
+                           (day,))
+        self.c.execute("DROP TABLE program")
+        self.c.execute("CREATE VIEW program AS " + " UNION ALL ".join(
+            f"SELECT * FROM {x}" for x in tables) if tables else
+            "CREATE VIEW program AS SELECT '' AS channel, 0 AS start, "
+            "0 AS stop, '' AS desc WHERE 0")
+        self.db.commit()
+        self.c.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.c.execute("VACUUM")
+
+    def _migrate_v5(self) -> None:
+        """
+            Moves the titles into a table of their own, the day tables
+            refer to them by hash
+        """
+        self.db.create_function('title_id', 1, self._title_id,
+                                deterministic=True)
+        self._create_title_table()
+        tables = self._day_tables(self.c)
+        # renaming a table is checked against the views referring to it,
+        # the view of version 4 goes and is recreated over the new tables
+        self.c.execute("DROP VIEW IF EXISTS program")
+        for table in tables:
+            self.c.execute("INSERT OR IGNORE INTO title "
+                           f"SELECT title_id(desc), desc FROM {table}")
+            self.c.execute(f"ALTER TABLE {table} RENAME TO old_{table}")
+            self._create_day_table(self.c, table)
+            self.c.execute(f"INSERT INTO {table} SELECT channel, start, stop,"
+                           f" title_id(desc) FROM old_{table}")
+            self.c.execute(f"DROP TABLE old_{table}")
+        self._create_view(self.c, tables)
+        self.db.commit()
+        self.c.executescript("PRAGMA incremental_vacuum")
+
+    def _migrate_v6(self) -> None:
+        """
+            Re-ingests the guide, the times of which were converted
+            with the UTC offset of the day of the ingest
+        """
+        self._create_member_table()
+        self.c.execute("DELETE FROM member")
+        self.refill = os.path.exists(self._guide_file())
+
+    def _migrate_v7(self) -> None:
+        """
+            Adds the revision of the programmes, for the snapshot to
+            tell whether it is up to date
+        """
+        self._create_meta_table()
+
+    def _migrate_v8(self) -> None:
+        """
+            Drops the time range indexes of the day tables, which none
+            of the queries made use of
+        """
+        for table in self._day_tables(self.c):
+            self.c.execute(f"DROP INDEX IF EXISTS {table}_start")
+        self.db.commit()
+        self.c.executescript("PRAGMA incremental_vacuum")
+
+    def _utc_offset(self, timestamp: Optional[int] = None) -> int:
+        """
+            UTC offset of `tz` (or of the local zone) in seconds at
+            `timestamp`, now if not given. Zones change their offsets
+            at whole quarter hours, so they are looked up once per
+            quarter hour.
+        """
+        if timestamp is None:
+            timestamp = self._get_current_time()
+        quarter = timestamp // 900
+        offset = self.offsets.get(quarter)
+        if offset is None:
+            moment = datetime.datetime.fromtimestamp(
+                quarter * 900, datetime.timezone.utc).astimezone(self.tz)
+            offset = self.offsets[quarter] = \
+                int(moment.utcoffset().total_seconds())
+        return offset
+
+    def _to_epoch(self, wall: int) -> int:
+        """
+            Converts a local wall time, counted in seconds as if it
+            were UTC, into epoch seconds
+        """
+        return wall - self._utc_offset(wall - self._utc_offset(wall))
+
+    def _localize(self, rows: List[tuple]) -> List[tuple]:
+        """
+            Converts the local wall times of JTV rows into epoch seconds,
+            at once if the offset stays the same over all of them
+        """
+        if not rows:
+            return rows
+        first = self._to_epoch(rows[0][1]) - rows[0][1]
+        if self._to_epoch(rows[-1][2]) - rows[-1][2] == first:
+            return [(channel, start + first, stop + first, title)
+                    for channel, start, stop, title in rows]
+        return [(channel, self._to_epoch(start), self._to_epoch(stop), title)
+                for channel, start, stop, title in rows]
+
+    def _day_start(self, date: str, clock: int = 0) -> int:
+        """
+            Epoch seconds of `clock` seconds of local time into a day,
+            days changing the clock are an hour shorter or longer
+        """
+        day = datetime.datetime.strptime(date, "%Y%m%d")
+        return self._to_epoch(calendar.timegm(day.timetuple()) + clock)
+
+    def _today(self) -> int:
+        return self._day_start(
+            datetime.datetime.now(self.tz).strftime("%Y%m%d"))
+
+    def _clock(self, timestamp: int) -> str:
+        hours, minutes = divmod(
+            (timestamp + self._utc_offset(timestamp)) % 86400 // 60, 60)
+        return f"{hours:02}:{minutes:02}"
 
     def _flush_database(self) -> None:
         """
-            Flushes records omitting the records from cached days
+            Drops the days older than the cached ones
         """
-        logging.info(f'flushing database {self.dbname}')
-        today = datetime.date.today()
-        past_date = (today - datetime.timedelta(days=self.cached_days_num)).strftime("%Y%m%d000000")
-        prev_date = (today - datetime.timedelta(days=1)).strftime("%Y%m%d235900")
+        logging.info(f'flushing database {self.wname}')
+        past_table = self._day_table(
+            self._local_day(self._today()) - self.cached_days_num)
         try:
-            self.c.execute("DELETE FROM program WHERE start < ? OR start > ?",
-                           (past_date, prev_date))
-            self.db.commit()
+            self.w.execute("BEGIN")
+            tables = self._day_tables(self.w)
+            expired = [x for x in tables if x < past_table]
+            for table in expired:
+                self.w.execute(f"DROP TABLE {table}")
+            tables = tables[len(expired):]
+            self._create_view(self.w, tables)
+            if expired:
+                self._delete_orphan_titles(tables)
+                self._bump_revision(self.w)
+            self.wdb.commit()
         except sqlite3.Error as e:
             logging.error(f'Database error: {e}')
-            os.remove(self.dbname)
-            return
-        self.c.execute("VACUUM")
+            self.wdb.rollback()
+            raise
+        # hands the pages of the dropped days back to the file system,
+        # executescript steps the pragma until every free page is gone
+        self.w.executescript("PRAGMA incremental_vacuum")
+
+    def _begin_bulk_load(self) -> None:
+        open(self.wname + "-ingest", 'w').close()
+        for pragma in self.bulk_pragmas:
+            self.w.execute(pragma)
+        self.w.execute("BEGIN")
+
+    def _end_bulk_load(self) -> None:
+        for pragma in self.default_pragmas:
+            self.w.execute(pragma)
+        os.remove(self.wname + "-ingest")
+
+    def _changed_channels(self):
+        """
+            Compares CRC32 and size of the archive members with the ones
+            recorded at the last ingest. Returns the channels to re-ingest,
+            the channels gone from the archive and the new member records.
+        """
+        stored = {name: (channel, crc, size) for name, channel, crc, size
+                  in self.w.execute("SELECT * FROM member")}
+        with zipfile.ZipFile(self.jtv_file, 'r') as archive:
+            members = channel_members(archive)
+            infos = {x.filename: (x.CRC, x.file_size)
+                     for x in archive.infolist()}
+        changed, records = [], []
+        for channel_id, name in members:
+            files = {x: (channel_id,) + infos.get(x, (None, None))
+                     for x in (name + '.pdt', name + '.ndx')}
+            if any(stored.get(x) != record for x, record in files.items()):
+                changed.append((channel_id, name))
+            records += [(x,) + record for x, record in files.items()]
+        removed = {x[0] for x in stored.values()} - {x[0] for x in members}
+        return changed, removed, records
+
+    def _read_channels(self, members: List[Tuple[str, str]],
+                       parallel: bool = True):
+        """
+            Yields (channel_id, rows) for the given channels of the archive,
+            decoding them in worker processes if more than one worker is set
+        """
+        # the archive holds local wall times, converted here rather
+        # than in the workers with the offset valid at each of them
+        today = self._today()
+        today += self._utc_offset(today)
+        shift = int(self.offset * 3600)
+        with zipfile.ZipFile(self.jtv_file, 'r') as archive:
+            if not parallel or self.workers < 2 or len(members) < 2:
+                for channel_id, name in members:
+                    yield channel_id, self._localize(read_channel(
+                        archive, channel_id, name, shift, today))
+                return
+        chunk_size = max(len(members) // (self.workers * 4), 1)
+        chunks = [members[i:i + chunk_size]
+                  for i in range(0, len(members), chunk_size)]
+        try:
+            with ProcessPoolExecutor(self.workers) as executor:
+                for chunk, batches in zip(chunks, executor.map(
+                        read_channels, repeat(self.jtv_file), chunks,
+                        repeat(shift), repeat(today))):
+                    for (channel_id, _), rows in zip(chunk, batches):
+                        yield channel_id, self._localize(rows)
+        except (OSError, NotImplementedError, BrokenProcessPool) as e:
+            logging.warning(f'parallel decoding failed ({e}), '
+                            'falling back to a single process')
+            self.workers = 1
+            yield from self._read_channels(members)
+
+    def _read_xmltv(self):
+        """
+            Yields row batches streamed from the XMLTV guide
+        """
+        today = self._today()
+        with open_guide(self.xmltv_file) as file:
+            rows = []
+            for row in iter_programmes(file, int(self.offset * 3600),
+                                       self._to_epoch, today):
+                rows.append(row)
+                if len(rows) >= self.batch_size:
+                    yield None, rows
+                    rows = []
+            yield None, rows
 
     def _add_to_database(self) -> None:
-        logging.info(f'writing into database {self.dbname}')
-        archive = zipfile.ZipFile(self.jtv_file, 'r')
-        today = int(datetime.date.today().strftime("%Y%m%d000000"))
-        for filename in archive.namelist():
-            if filename.endswith(".pdt"):
-                try:
-                    unicode_name = bytes(filename, 'cp437').decode('cp866')
-                except ValueError:
-                    unicode_name = bytes(filename, 'utf-8')
-                channel_id = unicode_name[0:-4]
-                if channel_id.isdigit():
-                    continue
-                titles = archive.read(filename)
-                if titles[0:26] != b'JTV 3.x TV Program Data\n\n\n':
-                    logging.warn("invalid JTV format")
-                    continue
-                channel_titles = self._parse_titles(titles)
-                schedules = archive.read(filename[0:-4] + ".ndx")
-                channel_schedules = self._parse_schedule(schedules)
-                i = 0
-                for entry in channel_titles:
-                    if i < len(channel_schedules) - 1:
-                        time_format = "%Y%m%d%H%M%S"
-                        start = channel_schedules[i].strftime(time_format)
-                        stop = channel_schedules[i+1].strftime(time_format)
-                        i += 1
-                        if int(start) >= today:
-                            try:
-                                self.c.execute(
-                                    "INSERT INTO program VALUES (?,?,?,?)",
-                                    (channel_id, start, stop, entry))
-                            except sqlite3.IntegrityError:
-                                pass
-        archive.close()
-        self.db.commit()
-        logging.info(f'database {self.dbname} is ready')
+        logging.info(f'writing into database {self.wname}')
+        rows_num = 0
+        begin = time.perf_counter()
+        today_table = self._day_table(self._local_day(self._today()))
+        records, total = [], 0
+        self._begin_bulk_load()
+        try:
+            self.tables = set(self._day_tables(self.w))
+            self.view_changed = False
+            self.title_ids = {}
+            eager = set()
+            if self._guide_file() == self.xmltv_file:
+                for table in [x for x in self.tables if x >= today_table]:
+                    self.w.execute(f"DROP TABLE {table}")
+                    self.tables.remove(table)
+                    self.view_changed = True
+                batches = self._read_xmltv()
+            else:
+                members, removed, records = self._changed_channels()
+                logging.info(f'{len(members)} channels changed, '
+                             f'{len(removed)} removed')
+                self._delete_channels(removed, today_table)
+                members.sort(key=lambda x: self.priority.get(x[0], len(self.priority)))
+                first = [x for x in members if self.priority.get(
+                    x[0], self.eager_channels) < self.eager_channels]
+                eager = {x[0] for x in first}
+                batches = chain(
+                    self._read_channels(first, parallel=False),
+                    self._read_channels(members[len(first):]))
+                total = len(members)
+            # the head of the priority list is committed one by one and
+            # the rest, still in priority order, in chunks, so that they
+            # can be read while the rest is loading
+            channels, pending = set(), []
+            for channel_id, rows in batches:
+                if channel_id is not None:
+                    self._delete_channels([channel_id], today_table)
+                    channels.add(channel_id)
+                else:
+                    channels.update(x[0] for x in rows)
+                self._insert_rows(rows)
+                rows_num += len(rows)
+                pending.append((channel_id, rows))
+                if channel_id in eager or len(pending) >= self.commit_every:
+                    self._commit_chunk(pending, len(channels), total, rows_num)
+                    self.w.execute("BEGIN")
+            self.w.execute("DELETE FROM member")
+            self.w.executemany("INSERT INTO member VALUES (?,?,?,?)", records)
+            self._commit_chunk(pending, len(channels), total, rows_num)
+        except BaseException:
+            self.wdb.rollback()
+            raise
+        finally:
+            self._end_bulk_load()
+        elapsed = time.perf_counter() - begin
+        logging.info(f'database {self.wname} is ready: {rows_num} rows '
+                     f'in {elapsed:.2f}s ({rows_num / elapsed:.0f} rows/s)')
+
+    def _delete_channels(self, channels, today_table: str) -> None:
+        """
+            Deletes the programmes of `channels` from today on
+        """
+        for table in self.tables:
+            if table >= today_table:
+                self.w.executemany(f"DELETE FROM {table} WHERE channel = ?",
+                                   [(x,) for x in channels])
+
+    def _insert_rows(self, rows: List[tuple]) -> None:
+        """
+            Inserts rows into the tables of their days, creating
+            the missing ones, and their titles into the title table
+        """
+        days, titles, ids = {}, [], self.title_ids
+        for channel, start, stop, desc in rows:
+            title_id = ids.get(desc)
+            if title_id is None:
+                title_id = ids[desc] = self._title_id(desc)
+                titles.append((title_id, desc))
+            days.setdefault(self._local_day(start), []).append(
+                (channel, start, stop, title_id))
+        self.w.executemany("INSERT OR IGNORE INTO title VALUES (?,?)", titles)
+        for day, day_rows in days.items():
+            table = self._day_table(day)
+            if table not in self.tables:
+                self._create_day_table(self.w, table)
+                self.tables.add(table)
+                self.view_changed = True
+            self.w.executemany(
+                f"INSERT OR IGNORE INTO {table} VALUES (?,?,?,?)", day_rows)
+
+    def _commit_chunk(self, pending: List[tuple], done: int, total: int,
+                      rows_num: int) -> None:
+        """
+            Commits the channels ingested so far and makes them visible
+            in the now/next index
+        """
+        if self.view_changed:
+            self._create_view(self.w, sorted(self.tables))
+            self.view_changed = False
+        self._bump_revision(self.w)
+        self.wdb.commit()
+        now = self._get_current_time()
+        for channel_id, rows in pending:
+            if channel_id is not None and not self.snapshot:
+                self.index.replace(channel_id, rows, now)
+        pending.clear()
+        if self.progress:
+            self.progress(done, total, rows_num)
+
+    def _build_index(self, rewrite: bool = False) -> None:
+        """
+            Sets up the in-memory now/next index, which loads the
+            programmes of a channel that are not over yet on its first
+            lookup, or maps the snapshot in snapshot mode
+        """
+        if self.snapshot:
+            self._load_snapshot(rewrite)
+            return
+        self.index = ScheduleIndex(loader=self._index_rows)
+
+    def _index_rows(self, channel: Optional[str]) -> sqlite3.Cursor:
+        """
+            Programmes that are not over yet of a channel, or of every
+            channel if None, for the now/next index
+        """
+        now = self._get_current_time()
+        if channel is None:
+            return self.c.execute(self.queries['index'], {'now': now})
+        return self.c.execute(self.queries['upcoming'],
+                              {'channel': channel, 'now': now})
 
-    def _cut(self, text):
-        return text if len(text) < 65 else text[:text.rfind('.', 0, 65)]
+    def _load_snapshot(self, rewrite: bool = False) -> None:
+        """
+            Maps the snapshot file, exporting the database into it first
+            when it is missing, of another revision of the database,
+            as after an ingest by another process, or `rewrite` is set
+        """
+        revision = self._revision()
+        if not rewrite and os.path.exists(self.snapname):
+            try:
+                snapshot = ScheduleSnapshot(self.snapname)
+            except ValueError as e:
+                logging.warning(e)
+            else:
+                if snapshot.revision == revision:
+                    self.index = snapshot
+                    logging.info(f'mapped {len(self.index)} channels')
+                    return
+                snapshot.close()
+                logging.info(f'{self.snapname} is out of date')
+        logging.info(f'writing snapshot {self.snapname}')
+        try:
+            write_snapshot(self.snapname,
+                           self.c.execute(self.queries['snapshot']), revision)
+        except PermissionError:
+            # Windows does not replace a file that is mapped
+            self.index.close()
+            write_snapshot(self.snapname,
+                           self.c.execute(self.queries['snapshot']), revision)
+        self.index = ScheduleSnapshot(self.snapname)
+        logging.info(f'mapped {len(self.index)} channels')
+
+    def _programmes(self, channel: str, begin: int, end: int,
+                    now: int = None):
+        """
+            (start, stop, desc) of the programmes of a channel running
+            between `begin` and `end`, only the ones started by `now`
+            if it is given
+        """
+        if self.snapshot:
+            return self.index.programmes(
+                channel, begin, end if now is None else min(end, now))
+        params = {'channel': channel, 'begin': begin, 'end': end, 'now': now}
+        return self.c.execute(
+            self.queries['day' if now is None else 'timeshift'], params)
 
     def _get_current_time(self):
-        return int(datetime.datetime.now(self.tz).strftime("%Y%m%d%H%M%S"))
+        return int(time.time())
+
+    def explain(self) -> str:
+        """
+            Prints the query plan of every query the handler runs
+        """
+        params = {'channel': '', 'now': 0, 'begin': 0, 'end': 0}
+        lines = []
+        for name, query in self.queries.items():
+            lines.append(f'{name}: {query}')
+            for row in self.c.execute("EXPLAIN QUERY PLAN " + query, params):
+                lines.append(f'  {row[-1]}')
+        text = '\n'.join(lines)
+        print(text)
+        return text
+
+    def programmes(self, date: str, channel: str,
+                   started: bool = False) -> List[Programme]:
+        """
+            Programmes of a channel on a day, with `started` only
+            the ones that have begun
+        """
+        return [Programme(*x) for x in self._programmes(
+            channel, self._day_start(date), self._day_start(date, 86340),
+            self._get_current_time() if started else None)]
+
+    def upcoming(self, channel: str, limit: int = 5) -> List[Programme]:
+        """
+            The current programme of a channel and the ones following it
+        """
+        return [Programme(*x) for x in self.index.upcoming(
+            channel, self._get_current_time(), limit)]
+
+    def current(self, channel: str) -> Optional[Programme]:
+        programmes = self.upcoming(channel, 1)
+        return programmes[0] if programmes else None
+
+    def listings(self, span: int = 600) -> List[Listing]:
+        """
+            Programmes of all channels running within `span` seconds,
+            latest start first
+        """
+        curr_time = self._get_current_time()
+        return [Listing(*x) for x in self.index.overview(
+            curr_time, curr_time + span)]
 
     def get_schedule(self,
                      date: str, channel: str, full_day: bool = False,
                      curr_color: str = 'indigo') -> str:
-        text = ""
-        curr_time = self._get_current_time()
-        format = lambda x, y, z: \
-            "<tr{}><td><b>{}:{}</b></td><td><span>{}</span></td></tr>"\
-            .format(x, str(y)[-6:-4], str(y)[-4:-2], z)
-        if not full_day:
-            for (start, note) in self.c.execute(
-                    "SELECT start, desc FROM program "
-                    "WHERE channel = ? AND stop > ? LIMIT 5;",
-                    (channel, curr_time)):
-                style = f" style='color:{curr_color};'" if curr_time > start else ""
-                text += format(style, start, note)
-        else:
-            for (start, stop, note) in self.c.execute(
-                    "SELECT start, stop, desc FROM program "
-                    "WHERE channel = ? AND stop > ? AND start < ?;",
-                    (channel, date + '000000', date + '235900')):
-                if curr_time > start and curr_time > stop:
-                    text += format(" style='color:grey;'", start, self._cut(note))
-                elif curr_time > start and curr_time < stop:
-                    text += format(f" style='color:{curr_color};'", start, note)
-                else:
-                    text += format("", start, self._cut(note))
-        return "<table>{}</table>".format(
-            text if text else "<tr><td>n/a</td></tr>")
+        programmes = self.programmes(date, channel) if full_day\
+            else self.upcoming(channel)
+        return schedule_html(programmes, self._get_current_time(),
+                             self._clock, full_day, curr_color)
 
     def get_overview(self, channel_map: dict) -> str:
-        text = ""
-        curr_time = self._get_current_time()
-        format = lambda w, x, y, z: \
-            "<tr><td>{}</td><td><b>{}:{}..{}:{}</b></td>"\
-            "<td><span>{}</span></td></tr>\r\n"\
-            .format(
-                w, str(x)[-6:-4], str(x)[-4:-2], str(y)[-6:-4], str(y)[-4:-2], z)
-        for (channel, start, stop, note) in self.c.execute(
-                "SELECT channel, start, stop, desc FROM program "
-                "WHERE start < ? AND stop > ? ORDER BY start DESC, stop ASC;",
-                (curr_time + 1000, curr_time)):
-            if channel in channel_map:
-                text += format(channel_map[channel], start, stop, self._cut(note))
-        return "<table>\r\n{}</table>".format(text)
+        return overview_html(self.listings(), channel_map, self._clock)
 
     def get_timeshift_list(self, date: str, channel: str):
-        curr_time = self._get_current_time()
-        for (start, stop, note) in self.c.execute(
-            "SELECT start, stop, desc FROM program "
-            "WHERE channel = ? AND stop > ? AND (start < ? AND start < ?);",
-                (channel, date + '000000', date + '235900', curr_time)):
-            yield (start, stop,
-                   "{}:{}".format(str(start)[-6:-4], str(start)[-4:-2]),
-                   self._cut(note)
-                   )
+        for (start, stop, note) in self.programmes(date, channel, True):
+            yield (start, stop, self._clock(start), cut(note))
 
     def get_current_program(self, channel: str):
-        note = ""
-        curr_time = self._get_current_time()
-        for (note,) in self.c.execute(
-                "SELECT desc FROM program "
-                "WHERE channel = ? AND stop > ? LIMIT 1;",
-                (channel, curr_time)):
-            pass
-        return " -- " + self._cut(note) if len(note) else note
+        return current_text(self.current(channel))
@@ -0,0 +1,114 @@
+# Copyright (c) 2016-2025 Blaze <blaze@vivaldi.net>
+# Licensed under the GNU General Public License, version 3 or later.
+# See the file http://www.gnu.org/copyleft/gpl.txt.
+
+import threading
+from array import array
+from bisect import bisect_right
+from typing import Callable, Iterable, List, Optional, Tuple
+
+
+class ScheduleIndex:
+    """
+        Per-channel sorted start/stop arrays answering now/next lookups
+        without touching the database. Given a loader, the entry of
+        a channel is only read on its first lookup.
+    """
+
+    def __init__(self, rows: Iterable[tuple] = (),
+                 loader: Optional[Callable[[Optional[str]],
+                                           Iterable[tuple]]] = None):
+        """
+            Takes (channel, start, stop, desc) rows ordered by channel,
+            start. `loader` returns such rows, the ones not over yet,
+            of a channel or of every channel if given None.
+        """
+        self.channels = {}
+        self.loader = loader
+        self.complete = loader is None
+        # a lookup reading the database and an ingest swapping in the
+        # rows it has committed take their turns, so the older rows
+        # of the two never win
+        self.lock = threading.Lock()
+        self._add(rows)
+
+    def _add(self, rows: Iterable[tuple]) -> None:
+        """
+            Adds the entries of the channels that have none yet
+        """
+        channel, starts, stops, titles = None, None, None, None
+        for row in rows:
+            if row[0] != channel:
+                channel = row[0]
+                starts, stops, titles = array('q'), array('q'), []
+                self.channels.setdefault(channel, (starts, stops, titles))
+            starts.append(row[1])
+            stops.append(row[2])
+            titles.append(row[3])
+
+    def _entry(self, channel: str) -> Optional[Tuple[array, array, list]]:
+        entry = self.channels.get(channel)
+        if entry is None and not self.complete:
+            with self.lock:
+                if channel not in self.channels:
+                    self._add(self.loader(channel))
+                    # a channel without programmes is not asked for again
+                    self.channels.setdefault(
+                        channel, (array('q'), array('q'), []))
+                entry = self.channels[channel]
+        return entry
+
+    def replace(self, channel: str, rows: List[tuple], now: int) -> None:
+        """
+            Swaps in freshly ingested (channel, start, stop, desc) rows
+            of a channel, keeping those that are not over at `now`
+        """
+        rows = sorted((x for x in rows if x[2] > now), key=lambda x: x[1])
+        entry = (array('q', (x[1] for x in rows)),
+                 array('q', (x[2] for x in rows)), [x[3] for x in rows])
+        with self.lock:
+            self.channels[channel] = entry
+
+    def __len__(self) -> int:
+        return len(self.channels)
+
+    def _first(self, starts: array, stops: array, now: int) -> int:
+        """
+            Position of the first programme that ends after `now`
+        """
+        i = bisect_right(starts, now) - 1
+        return i if i >= 0 and stops[i] > now else i + 1
+
+    def upcoming(self, channel: str, now: int,
+                 limit: int = 1) -> List[Tuple[int, int, str]]:
+        """
+            Returns the current programme of a channel and the ones following it
+        """
+        entry = self._entry(channel)
+        if entry is None:
+            return []
+        starts, stops, titles = entry
+        i = self._first(starts, stops, now)
+        return list(zip(starts[i:i + limit], stops[i:i + limit],
+                        titles[i:i + limit]))
+
+    def overview(self, now: int, end: int) -> List[Tuple[str, int, int, str]]:
+        """
+            Returns the programmes of all channels running between `now`
+            and `end`, latest start first
+        """
+        if not self.complete:
+            with self.lock:
+                self._add(self.loader(None))
+                self.complete = True
+        entries = []
+        # an ingest may add channels meanwhile
+        for channel, (starts, stops, titles) in list(self.channels.items()):
+            i = self._first(starts, stops, now)
+            while i < len(starts) and starts[i] < end:
+                entries.append((channel, starts[i], stops[i], titles[i]))
+                i += 1
+        # channels are loaded as they are looked up, ties go by channel
+        # as they do in the snapshot
+        entries.sort(key=lambda x: (-x[1], x[2], x[0]))
+        return entries
@@ -0,0 +1,24 @@
+# Copyright (c) 2016-2025 Blaze <blaze@vivaldi.net>
+# Licensed under the GNU General Public License, version 3 or later.
+# See the file http://www.gnu.org/copyleft/gpl.txt.
+
+from typing import NamedTuple
+
+
+class Programme(NamedTuple):
+    """
+        A programme of a channel, times are epoch seconds
+    """
+    start: int
+    stop: int
+    title: str
+
+
+class Listing(NamedTuple):
+    """
+        A programme together with its channel, as shown in the overview
+    """
+    channel: str
+    start: int
+    stop: int
+    title: str
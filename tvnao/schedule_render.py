@@ -0,0 +1,77 @@
+# Copyright (c) 2016-2025 Blaze <blaze@vivaldi.net>
+# Licensed under the GNU General Public License, version 3 or later.
+# See the file http://www.gnu.org/copyleft/gpl.txt.
+
+import json
+from typing import Callable, Iterable, Optional
+
+from .schedule_records import Listing, Programme
+
+
+def cut(text: str) -> str:
+    """
+        Shortens a long title to its first sentences
+    """
+    return text if len(text) < 65 else text[:text.rfind('.', 0, 65)]
+
+
+def schedule_html(programmes: Iterable[Programme], now: int,
+                  clock: Callable[[int], str], full_day: bool = False,
+                  curr_color: str = 'indigo') -> str:
+    """
+        Renders programmes as table rows, the current one highlighted.
+        The full-day view greys out the past and shortens all but
+        the current title.
+    """
+    rows = []
+    for start, stop, title in programmes:
+        if not full_day:
+            style = f" style='color:{curr_color};'" if now > start else ""
+        elif now > start and now > stop:
+            style, title = " style='color:grey;'", cut(title)
+        elif now > start and now < stop:
+            style = f" style='color:{curr_color};'"
+        else:
+            style, title = "", cut(title)
+        rows.append(f"<tr{style}><td><b>{clock(start)}</b></td>"
+                    f"<td><span>{title}</span></td></tr>")
+    return "<table>{}</table>".format(
+        "".join(rows) if rows else "<tr><td>n/a</td></tr>")
+
+
+def overview_html(listings: Iterable[Listing], channel_map: dict,
+                  clock: Callable[[int], str]) -> str:
+    """
+        Renders the listings of the channels in `channel_map`
+        under their names
+    """
+    return "<table>\r\n{}</table>".format("".join(
+        f"<tr><td>{channel_map[x.channel]}</td>"
+        f"<td><b>{clock(x.start)}..{clock(x.stop)}</b></td>"
+        f"<td><span>{cut(x.title)}</span></td></tr>\r\n"
+        for x in listings if x.channel in channel_map))
+
+
+def current_text(programme: Optional[Programme]) -> str:
+    """
+        Suffix for a channel name telling what is on
+    """
+    return " -- " + cut(programme.title) if programme and programme.title else ""
+
+
+def schedule_text(programmes: Iterable[Programme],
+                  clock: Callable[[int], str]) -> str:
+    return "\n".join(f"{clock(x.start)} {x.title}" for x in programmes)
+
+
+def overview_text(listings: Iterable[Listing],
+                  clock: Callable[[int], str]) -> str:
+    return "\n".join(f"{x.channel}\t{clock(x.start)}..{clock(x.stop)} {x.title}"
+                     for x in listings)
+
+
+def to_json(records: Iterable[tuple]) -> str:
+    """
+        Renders programmes or listings as a JSON array of objects
+    """
+    return json.dumps([x._asdict() for x in records], ensure_ascii=False)
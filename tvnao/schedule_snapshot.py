@@ -0,0 +1,156 @@
+# Copyright (c) 2016-2025 Blaze <blaze@vivaldi.net>
+# Licensed under the GNU General Public License, version 3 or later.
+# See the file http://www.gnu.org/copyleft/gpl.txt.
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_right
+from typing import Iterable, List, Tuple
+
+# magic, byte order, revision of the database, channels, programmes,
+# string pool size
+HEADER = struct.Struct('<4s4sQQQQ')
+# name offset and length in the pool, first programme and their number
+CHANNEL = struct.Struct('<IIII')
+MAGIC = b'TVS2'
+BYTEORDER = sys.byteorder[0].encode().ljust(4, b'\0')
+
+
+def write_snapshot(filename: str, rows: Iterable[tuple],
+                   revision: int = 0) -> None:
+    """
+        Writes (channel, start, stop, desc) rows ordered by channel, start
+        as per-channel ranges over fixed-width start, stop and title arrays
+        with the text kept once in a string pool, marked with the
+        `revision` of the database they come from. The file is written
+        aside and moved in place.
+    """
+    channels, pool, strings = [], bytearray(), {}
+    starts, stops = array('q'), array('q')
+    title_offsets, title_lengths = array('I'), array('I')
+
+    def intern(text: str) -> Tuple[int, int]:
+        if text not in strings:
+            data = text.encode('utf-8')
+            strings[text] = (len(pool), len(data))
+            pool.extend(data)
+        return strings[text]
+
+    for channel, start, stop, desc in rows:
+        if not channels or channels[-1][0] != channel:
+            channels.append([channel, len(starts), 0])
+        channels[-1][2] += 1
+        starts.append(start)
+        stops.append(stop)
+        offset, length = intern(desc)
+        title_offsets.append(offset)
+        title_lengths.append(length)
+    names = [intern(x[0]) for x in channels]
+    with open(filename + '.tmp', 'wb') as file:
+        file.write(HEADER.pack(MAGIC, BYTEORDER, revision, len(channels),
+                               len(starts), len(pool)))
+        for (offset, length), (_, first, count) in zip(names, channels):
+            file.write(CHANNEL.pack(offset, length, first, count))
+        for values in (starts, stops, title_offsets, title_lengths):
+            file.write(values.tobytes())
+        file.write(pool)
+    os.replace(filename + '.tmp', filename)
+
+
+class ScheduleSnapshot:
+    """
+        Read-only view of a snapshot file, memory-mapped so that the
+        processes reading it share the page cache and nothing is copied
+        until a title is decoded. Answers the same lookups as ScheduleIndex.
+    """
+
+    def __init__(self, filename: str):
+        with open(filename, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        try:
+            magic, byteorder, self.revision, channels_num, size, pool_size = \
+                HEADER.unpack_from(self.view)
+        except struct.error:
+            magic = byteorder = None
+        if magic != MAGIC or byteorder != BYTEORDER:
+            self.close()
+            raise ValueError(f'{filename} was not written by this version '
+                             'on this machine')
+        pos = HEADER.size + channels_num * CHANNEL.size
+        arrays = []
+        for code, width in (('q', 8), ('q', 8), ('I', 4), ('I', 4)):
+            arrays.append(self.view[pos:pos + size * width].cast(code))
+            pos += size * width
+        self.starts, self.stops, self.title_offsets, self.title_lengths = arrays
+        self.pool = self.view[pos:pos + pool_size]
+        self.channels = {}
+        for i in range(channels_num):
+            offset, length, first, count = CHANNEL.unpack_from(
+                self.view, HEADER.size + i * CHANNEL.size)
+            self.channels[self._text(offset, length)] = (first, first + count)
+
+    def close(self) -> None:
+        for name in ('starts', 'stops', 'title_offsets', 'title_lengths',
+                     'pool', 'view'):
+            if hasattr(self, name):
+                getattr(self, name).release()
+        self.map.close()
+
+    def __len__(self) -> int:
+        return len(self.channels)
+
+    def _text(self, offset: int, length: int) -> str:
+        return str(self.pool[offset:offset + length], 'utf-8')
+
+    def _title(self, i: int) -> str:
+        return self._text(self.title_offsets[i], self.title_lengths[i])
+
+    def _first(self, lo: int, hi: int, now: int) -> int:
+        """
+            Position of the first programme between `lo` and `hi`
+            that ends after `now`
+        """
+        i = bisect_right(self.starts, now, lo, hi) - 1
+        return i if i >= lo and self.stops[i] > now else i + 1
+
+    def upcoming(self, channel: str, now: int,
+                 limit: int = 1) -> List[Tuple[int, int, str]]:
+        """
+            Returns the current programme of a channel and the ones following it
+        """
+        if channel not in self.channels:
+            return []
+        lo, hi = self.channels[channel]
+        i = self._first(lo, hi, now)
+        return [(self.starts[x], self.stops[x], self._title(x))
+                for x in range(i, min(i + limit, hi))]
+
+    def programmes(self, channel: str, begin: int,
+                   end: int) -> List[Tuple[int, int, str]]:
+        """
+            Returns the programmes of a channel running between
+            `begin` and `end`
+        """
+        if channel not in self.channels:
+            return []
+        lo, hi = self.channels[channel]
+        i, entries = self._first(lo, hi, begin), []
+        while i < hi and self.starts[i] < end:
+            entries.append((self.starts[i], self.stops[i], self._title(i)))
+            i += 1
+        return entries
+
+    def overview(self, now: int, end: int) -> List[Tuple[str, int, int, str]]:
+        """
+            Returns the programmes of all channels running between `now`
+            and `end`, latest start first
+        """
+        entries = []
+        for channel in self.channels:
+            entries += [(channel,) + x for x in self.programmes(channel, now, end)]
+        entries.sort(key=lambda x: (-x[1], x[2]))
+        return entries
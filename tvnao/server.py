@@ -4,10 +4,14 @@
 
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from urllib.parse import parse_qs
+from urllib import request
 import argparse
+import io
 from pytz import timezone
 
-from schedule_handler import ScheduleHandler
+from tvnao.m3u_parser import guide_address
+from tvnao.schedule_handler import ScheduleHandler
+from tvnao.schedule_render import to_json
 
 sh = None
 tz = timezone('Europe/Minsk')
@@ -16,15 +20,21 @@ tz = timezone('Europe/Minsk')
 class customHandler(BaseHTTPRequestHandler):
     def do_POST(self):
         if self.path == "/viewProgram":
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
             length = int(self.headers['Content-Length'])
             fields = parse_qs(self.rfile.read(length).decode('utf-8'))
             channel = fields['id'][0]
             date = fields['date'][0]
             full_day = 'toggle_all_day' in fields['schedule']
-            response = sh.get_schedule(date, channel, full_day)
+            as_json = fields.get('format', [''])[0] == 'json'
+            self.send_response(200)
+            self.send_header('Content-type', 'application/json' if as_json
+                             else 'text/html')
+            self.end_headers()
+            if as_json:
+                response = to_json(sh.programmes(date, channel) if full_day
+                                   else sh.upcoming(channel))
+            else:
+                response = sh.get_schedule(date, channel, full_day)
             self.wfile.write(bytes(response, 'utf-8'))
         return
 
@@ -43,10 +53,25 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('-s', '--host', default='localhost')
     parser.add_argument('-p', '--port', default=8089, type=int)
-    parser.add_argument('-u', '--url', required=True, help="jtv file source")
+    parser.add_argument('-u', '--url', help="jtv file source")
+    parser.add_argument('-l', '--playlist',
+                        help="playlist giving the guide source if no url is set")
+    parser.add_argument('-m', '--memory', action='store_true',
+                        help="serve the guide from memory")
+    parser.add_argument('--snapshot', action='store_true',
+                        help="serve the guide from a memory-mapped snapshot")
     args = parser.parse_args()
+    if not args.url and args.playlist:
+        if not args.playlist.startswith('http'):
+            args.playlist = "file://" + args.playlist
+        with request.urlopen(args.playlist) as response:
+            args.url = guide_address(
+                io.TextIOWrapper(response, encoding='utf-8-sig'))
+    if not args.url:
+        parser.error("a guide source is needed, give it as url or in the playlist")
     global sh
-    sh = ScheduleHandler(args.url, tz=tz)
+    sh = ScheduleHandler(args.url, tz=tz, memory=args.memory,
+                          snapshot=args.snapshot)
     run(args.host, args.port)
 
 
@@ -20,6 +20,9 @@ class SettingsHelper():
                             '--force-window=immediate --no-resume-playback',
         'player/single':    False,
         'guide/addr':       '',
+        'guide/workers':    0,
+        'guide/memory':     False,
+        'guide/snapshot':   False,
         'timeshift/host':   '',
         'timeshift/port':   '',
         'timeshift/repl':   {},
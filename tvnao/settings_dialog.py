@@ -97,5 +97,5 @@ class Ui_Dialog(object):
         self.label_4.setText(_translate("Dialog", "Options:"))
         self.playerSingle.setText(_translate("Dialog", "Keep single player window"))
         self.groupBoxGuide.setTitle(_translate("Dialog", "Program Guide Address"))
-        self.guideAddr.setPlaceholderText(_translate("Dialog", "jtv.zip file address"))
+        self.guideAddr.setPlaceholderText(_translate("Dialog", "jtv.zip or XMLTV file address"))
         self.defaultsButton.setText(_translate("Dialog", "Defaults"))
@@ -2,8 +2,6 @@
 # Licensed under the GNU General Public License, version 3 or later.
 # See the file http://www.gnu.org/copyleft/gpl.txt.
 
-import datetime
-
 from PyQt6 import QtWidgets
 from PyQt6.QtCore import QSettings, QDate, pyqtSlot, pyqtSignal, Qt
 
@@ -66,10 +64,7 @@ class Timeshift(QtWidgets.QDialog):
                 self.replacements[self.channel_id] = channel_id
         item = self.ui.listWidget.currentItem()
         data = item.data(Qt.ItemDataRole.UserRole)
-        start = datetime.datetime.strptime(str(data[0]), "%Y%m%d%H%M%S")
-        stop = datetime.datetime.strptime(str(data[1]), "%Y%m%d%H%M%S")
-        diff_time = int((stop - start).total_seconds())
-        timestamp = int(start.replace().timestamp())
+        timestamp, diff_time = data[0], data[1] - data[0]
         self.start_player.emit(
             f"http://{host}:{port}/{channel_id}/mono-{timestamp}-{diff_time}.m3u8?filter=tracks:v1a{audio_chan}",
             f"{self.channel_name} -- {item.text()}")
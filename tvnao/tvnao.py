@@ -6,16 +6,20 @@ from os import sys, path
 from urllib import request, error
 from subprocess import Popen, DEVNULL
 import datetime
+import io
+import time
 import signal
-import re
 import logging
+import multiprocessing
 
 from PyQt6 import QtWidgets, QtGui
 from PyQt6.QtCore import (pyqtSlot, pyqtSignal,
-                          QObject, QThreadPool, QRunnable, Qt)
+                          QObject, QThreadPool, QRunnable, QTimer, Qt)
 from PyQt6.QtGui import QIcon, QPalette
 
 from .tvnao_widget import Ui_Form
+from .channel_model import ChannelList, ChannelModel, ChannelFilterModel
+from .m3u_parser import PlaylistParser, guide_address
 from .settings import SettingsHelper, SettingsDialog
 from .schedule_handler import ScheduleHandler
 from .guide_viewer import GuideViewer
@@ -26,16 +30,23 @@ from .tvnao_rc import *
 class WorkerSignals(QObject):
     signal_finished = pyqtSignal()
     signal_error = pyqtSignal(str)
+    signal_progress = pyqtSignal(int, int, int)
+    signal_result = pyqtSignal(object)
 
 
 class Worker(QRunnable):
 
-    def __init__(self, fn, *args, **kwargs):
+    def __init__(self, fn, *args, progress=False, result=False, **kwargs):
         super(Worker, self).__init__()
         self.fn = fn
         self.args = args
         self.kwargs = kwargs
         self.signals = WorkerSignals()
+        if progress:
+            self.kwargs['progress'] = self.signals.signal_progress.emit
+        if result:
+            # hands data over to the GUI thread, widgets are only touched there
+            self.kwargs['result'] = self.signals.signal_result.emit
 
     @pyqtSlot()
     def run(self):
@@ -51,6 +62,11 @@ class MainWindow(QtWidgets.QWidget):
     search_term = ""
     folded = False
     bookmarks = []
+    channel_ids = []
+    # the playlist is shown in parts of at most this many entries,
+    # or of what came in meanwhile on a slow link
+    list_batch_size = 1000
+    list_batch_interval = 0.1
 
     def __init__(self):
         super(MainWindow, self).__init__()
@@ -58,6 +74,20 @@ class MainWindow(QtWidgets.QWidget):
         self.ui.setupUi(self)
         if not QIcon.hasThemeIcon('video-television'):
             QIcon.setThemeName("breeze")
+        self.channel_model = ChannelModel(self.bookmarks, self)
+        self.channel_filter = ChannelFilterModel(self)
+        self.channel_filter.setSourceModel(self.channel_model)
+        self.ui.channelView.setModel(self.channel_filter)
+        # the list is laid out in batches as the event loop runs, scrolling
+        # to the current channel goes on until its batch is laid out
+        self.focus_pending = False
+        self.ui.channelView.verticalScrollBar().rangeChanged.connect(
+            self.follow_focus)
+        # filter once typing pauses rather than on every keystroke
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(150)
+        self.filter_timer.timeout.connect(self.apply_filter)
         # actions setup
         clear_action = QtGui.QAction(self)
         clear_action.setShortcut('Esc')
@@ -75,22 +105,22 @@ class MainWindow(QtWidgets.QWidget):
         copy_action = QtGui.QAction('Copy address', self)
         copy_action.setShortcut('Ctrl+Shift+C')
         copy_action.setIcon(QIcon.fromTheme('edit-copy'))
-        self.ui.listWidget.addAction(copy_action)
+        self.ui.channelView.addAction(copy_action)
         copy_action.triggered.connect(self.copy_to_clipboard)
         bookmark_action = QtGui.QAction('Bookmark Current', self)
         bookmark_action.setShortcut('Ctrl+Shift+B')
         bookmark_action.setIcon(QIcon.fromTheme('bookmark-new'))
         bookmark_action.triggered.connect(self.bookmark_current)
-        self.ui.listWidget.addAction(bookmark_action)
+        self.ui.channelView.addAction(bookmark_action)
         unbookmark_action = QtGui.QAction('Remove from Bookmarks', self)
         unbookmark_action.setShortcut('Ctrl+Shift+R')
         unbookmark_action.setIcon(QIcon.fromTheme('bookmark-remove'))
         unbookmark_action.triggered.connect(self.bookmark_remove)
-        self.ui.listWidget.addAction(unbookmark_action)
+        self.ui.channelView.addAction(unbookmark_action)
         # signal/slot setup
         self.ui.buttonGo.released.connect(self.activate_item)
-        self.ui.listWidget.itemDoubleClicked.connect(self.activate_item)
-        self.ui.listWidget.itemSelectionChanged.connect(self.update_guide)
+        self.ui.channelView.doubleClicked.connect(self.activate_item)
+        self.ui.channelView.selectionModel().currentChanged.connect(self.update_guide)
         self.ui.buttonGuide.released.connect(self.show_hide_guide)
         # gui setup
         self.ui.buttonGo.setShortcut('Return')
@@ -115,7 +145,7 @@ class MainWindow(QtWidgets.QWidget):
                        '&Quit', 'Ctrl+Q', self.quit)
         for action in menu.actions():
             action.setShortcutVisibleInContextMenu(True)
-        self.ui.listWidget.setContextMenuPolicy(Qt.ContextMenuPolicy.ActionsContextMenu)
+        self.ui.channelView.setContextMenuPolicy(Qt.ContextMenuPolicy.ActionsContextMenu)
         self.ui.buttonMenu.setIcon(QIcon.fromTheme('video-television'))
         self.ui.buttonMenu.setMenu(menu)
         self.ui.buttonGo.setIcon(QIcon.fromTheme('media-playback-start'))
@@ -139,23 +169,27 @@ class MainWindow(QtWidgets.QWidget):
         self.options = self.settings.value('player/options', type=str)
         self.keep_single = self.settings.value('player/single', type=bool)
         self.guide_addr = self.settings.value('guide/addr', type=str)
+        self.guide_workers = self.settings.value('guide/workers', type=int)
+        self.guide_memory = self.settings.value('guide/memory', type=bool)
+        self.guide_snapshot = self.settings.value('guide/snapshot', type=bool)
         self.bookmarks = self.settings.value('main/bookmarks', type=list)
+        self.channel_model.bookmarks = self.bookmarks
 
     def refresh_forced(self):
         self.folded = False
-        self.ui.listWidget.clear()
+        self.channel_model.set_channels(ChannelList([]))
         self.refresh_list_wrapper()
 
     def refresh_list_wrapper(self):
-        list_worker = Worker(self.refresh_list)
+        list_worker = Worker(self.refresh_list, result=True)
+        list_worker.signals.signal_result.connect(self.show_channels)
         list_worker.signals.signal_finished.connect(self.load_guide_wrapper)
         list_worker.signals.signal_error.connect(
             lambda x: QtWidgets.QMessageBox.warning(self, "Network Error", x))
         self.thread_pool.start(list_worker)
 
-    def refresh_list(self):
-        playlist, status, lists, offs, response = "", [], [], 0, None
-        self.view_bookmarks_action.setChecked(False)
+    def refresh_list(self, result):
+        status, lists, offs = [], [], 0
         if not self.playlist_addr:
             offs += 1
             self.playlist_addr = sys.argv[offs] if len(sys.argv) > offs else ""
@@ -164,6 +198,8 @@ class MainWindow(QtWidgets.QWidget):
                     "or as an application argument.")
         lists = [self.playlist_addr] +\
             (sys.argv[offs+1:] if len(sys.argv) > offs+1 else [])
+        parser, entries, group, channels = PlaylistParser(), [], "", None
+        emitted = time.monotonic()
         for list in lists:
             logging.info(f'getting remote playlist {list}')
             if not list.startswith('http'):
@@ -172,74 +208,85 @@ class MainWindow(QtWidgets.QWidget):
                 response = request.urlopen(list)
             except error.URLError as e:
                 status.append(str(e.reason))
+                continue
             except ValueError as e:
                 status.append(str(e))
-            playlist += response.read().decode('utf-8') if response else ""
-        counter = 0
-        for line in playlist.splitlines():
-            if line.startswith('#EXTM3U'):
-                if not self.guide_addr:
-                    match = re.match(r'.*url-tvg=([^\s,]*).*', line)
-                    self.guide_addr = match.group(1).strip('"') if match else ""
-            elif line.startswith('#EXTINF'):
-                counter += 1
-                name = "{}. {}".format(counter, line.split(',')[1])
-                match = re.match(r'.*tvg-(?:id|name)=([^\s,]*).*', line)
-                id = match.group(1).strip('"') if match else None
-                title = re.match(r'.*group-title=\"?([^\",]*).*', line)
-                if title:
-                    item = QtWidgets.QListWidgetItem(title.group(1))
-                    self.ui.listWidget.addItem(item)
-            elif line.startswith('udp://') or line.startswith('http://')\
-                    or line.startswith('file://'):
-                item = QtWidgets.QListWidgetItem(name)
-                if id in self.bookmarks:
-                    item.setIcon(QIcon.fromTheme('folder-bookmark'))
-                else:
-                    item.setIcon(QIcon.fromTheme('video-webm'))
-                item.setData(Qt.ItemDataRole.UserRole, (line, id))
-                self.ui.listWidget.addItem(item)
+                continue
+            with response:
+                # read line by line, the channels show up as they arrive
+                lines = io.TextIOWrapper(response, encoding='utf-8-sig')
+                for channel in parser.feed(lines):
+                    if channel.group and channel.group != group:
+                        group = channel.group
+                        entries.append((group, None, None))
+                    entries.append((f"{channel.number}. {channel.name}",
+                                    channel.url, channel.id))
+                    if len(entries) >= self.list_batch_size or\
+                            time.monotonic() - emitted > self.list_batch_interval:
+                        channels = ChannelList(entries, channels)
+                        result(channels)
+                        entries, emitted = [], time.monotonic()
+        if entries or channels is None:
+            result(ChannelList(entries, channels))
+        if not self.guide_addr:
+            self.guide_addr = parser.guide_addr
         return ' '.join(status)
 
+    def show_channels(self, channels):
+        if channels.first_row == 0:
+            self.view_bookmarks_action.setChecked(False)
+            self.channel_filter.bookmarks_only = False
+            self.channel_model.set_channels(channels)
+            self.channel_ids = list(channels.channel_ids)
+        else:
+            self.channel_model.append_channels(channels)
+            self.channel_ids += channels.channel_ids
+        self.ui.lineEditFilter.setPlaceholderText(
+            f"Filter {len(self.channel_ids)} channels ...")
+
     def set_focus(self):
-        row = self.ui.listWidget.currentRow()
-        if row > 0:
-            if not self.ui.listWidget.isRowHidden(row):
-                item = self.ui.listWidget.item(row)
-                self.ui.listWidget.scrollToItem(item)
+        index = self.ui.channelView.currentIndex()
+        if index.row() > 0:
+            self.focus_pending = True
+            self.follow_focus()
+
+    def follow_focus(self):
+        if not self.focus_pending:
+            return
+        view = self.ui.channelView
+        index = view.currentIndex()
+        view.scrollTo(index)
+        # done once it is in view, or gone
+        self.focus_pending = index.isValid() and\
+            not view.viewport().rect().intersects(view.visualRect(index))
 
     @pyqtSlot(str, name='on_lineEditFilter_textChanged')
     def filter(self, string):
-        self.folded = False
         self.search_term = string
-        for item in self.ui.listWidget.findItems("", Qt.MatchFlag.MatchContains):
-            data = item.data(Qt.ItemDataRole.UserRole)
-            check = self.view_bookmarks_action.isChecked()
-            item.setHidden(
-                (not check and string.lower() not in item.text().lower()
-                 and bool(data))
-                or
-                (check and (string.lower() not in item.text().lower()
-                            or not bool(data)
-                            or (bool(data) and data[1] not in self.bookmarks))))
+        if string:
+            self.filter_timer.start()
+        else:
+            # clearing shows everything at once
+            self.filter_timer.stop()
+            self.apply_filter()
+
+    def apply_filter(self):
+        self.folded = False
+        self.channel_filter.set_filter(
+            self.search_term, self.view_bookmarks_action.isChecked())
         self.set_focus()
 
     def activate_item(self):
-        selected_item = self.ui.listWidget.currentItem()
-        if not selected_item:
+        index = self.ui.channelView.currentIndex()
+        if not index.isValid():
             return
-        data = selected_item.data(Qt.ItemDataRole.UserRole)
+        data = index.data(Qt.ItemDataRole.UserRole)
         if not data:
             self.folded = False
-            row = self.ui.listWidget.currentRow() + 1
-            while row < self.ui.listWidget.count()\
-                    and bool(self.ui.listWidget.item(row).data(Qt.ItemDataRole.UserRole)):
-                item = self.ui.listWidget.item(row)
-                item.setHidden(not item.isHidden() or self.search_term.lower()
-                               not in item.text().lower())
-                row += 1
+            self.channel_filter.toggle_group(
+                self.channel_filter.mapToSource(index).row())
             return
-        title = selected_item.text() + self.sh.get_current_program(data[1])
+        title = index.data() + self.sh.get_current_program(data[1])
         self.play(data[0], title)
 
     @pyqtSlot(str, str)
@@ -282,10 +329,9 @@ class MainWindow(QtWidgets.QWidget):
 
     def update_guide(self):
         if not self.ui.guideBrowser.isVisible() \
-                or self.ui.listWidget.count() < 1:
+                or self.channel_filter.rowCount() < 1:
             return
-        item = self.ui.listWidget.currentItem()
-        data = item.data(Qt.ItemDataRole.UserRole) if item else None
+        data = self.ui.channelView.currentIndex().data(Qt.ItemDataRole.UserRole)
         if data:
             date = datetime.date.today()
             if self.ui.guideNextButton.isChecked():
@@ -312,23 +358,58 @@ class MainWindow(QtWidgets.QWidget):
         self.update_guide()
 
     def copy_to_clipboard(self):
-        data = self.ui.listWidget.currentItem().data(Qt.ItemDataRole.UserRole)
+        data = self.ui.channelView.currentIndex().data(Qt.ItemDataRole.UserRole)
         if bool(data):
             QtWidgets.QApplication.clipboard().setText(data[0])
 
     def load_guide_wrapper(self):
-        self.guide_worker = Worker(self.load_guide_archive)
+        # bookmarks first, then the channels in view and the playlist
+        # order, the view is only looked at in the GUI thread
+        priority = [x for x in dict.fromkeys(
+            self.bookmarks + self.shown_channel_ids() + self.channel_ids) if x]
+        self.guide_worker = Worker(self.load_guide_archive, priority,
+                                   progress=True)
+        self.guide_worker.signals.signal_progress.connect(self.show_guide_progress)
         self.guide_worker.signals.signal_finished.connect(self.update_guide)
+        self.guide_worker.signals.signal_finished.\
+            connect(lambda: self.ui.guideProgress.setVisible(False))
         self.thread_pool.start(self.guide_worker)
 
-    def load_guide_archive(self):
-        self.sh = ScheduleHandler(self.guide_addr)
+    def shown_channel_ids(self):
+        """
+            Ids of the current channel and of the ones in view
+        """
+        view, model = self.ui.channelView, self.channel_filter
+        area = view.viewport().rect()
+        first = view.indexAt(area.topLeft()).row()
+        last = view.indexAt(area.bottomLeft()).row()
+        if last < 0:
+            last = model.rowCount() - 1
+        indexes = [view.currentIndex()] + \
+            [model.index(x) for x in range(max(first, 0), last + 1)]
+        return [data[1] for data in (x.data(Qt.ItemDataRole.UserRole)
+                                     for x in indexes) if data]
+
+    def load_guide_archive(self, priority, progress):
+        sh = ScheduleHandler(self.guide_addr, workers=self.guide_workers,
+                             priority=priority, refresh=False,
+                             memory=self.guide_memory,
+                             snapshot=self.guide_snapshot)
+        # the cached guide is usable right away, the committed channels
+        # of a fresh one show up as the ingest goes on
+        self.sh = sh
+        sh.refresh(progress)
+
+    def show_guide_progress(self, done, total, rows):
+        self.ui.guideProgress.setMaximum(total)
+        self.ui.guideProgress.setValue(done)
+        self.ui.guideProgress.setToolTip(f"{done} channels, {rows} programs loaded")
+        self.ui.guideProgress.setVisible(True)
+        self.update_guide()
 
     def fold_everything(self):
         self.view_bookmarks_action.setChecked(False)
-        for item in self.ui.listWidget.findItems("", Qt.MatchFlag.MatchContains):
-            item.setHidden((self.search_term.lower() not in item.text().lower()
-                            or not self.folded) and bool(item.data(Qt.ItemDataRole.UserRole)))
+        self.channel_filter.fold_all(not self.folded)
         self.folded = not self.folded
 
     def show_settings(self):
@@ -337,54 +418,39 @@ class MainWindow(QtWidgets.QWidget):
         settings_dialog.destroyed.connect(self.load_settings)
 
     def show_guide_viewer(self):
-        item = self.ui.listWidget.currentItem()
-        channel = "" if not item else item.text()
-        list = [(x.text(), x.data(Qt.ItemDataRole.UserRole)[1]) for x in self.ui.listWidget
-                .findItems("", Qt.MatchFlag.MatchContains) if bool(x.data(Qt.ItemDataRole.UserRole))]
-        gv = GuideViewer(self, self.sh, list, channel)
+        channel = self.ui.channelView.currentIndex().data() or ""
+        gv = GuideViewer(self, self.sh, self.channel_model.channels(), channel)
         gv.show()
+        self.guide_worker.signals.signal_progress.\
+            connect(lambda *_: gv.reset_handler(self.sh))
         self.guide_worker.signals.signal_finished.\
             connect(lambda: gv.reset_handler(self.sh))
 
     def show_timeshift_dialog(self):
-        if self.ui.listWidget.count() < 1:
-            return
-        item = self.ui.listWidget.currentItem()
-        data = item.data(Qt.ItemDataRole.UserRole) if item else None
+        index = self.ui.channelView.currentIndex()
+        data = index.data(Qt.ItemDataRole.UserRole)
         if data:
-            title = self.ui.listWidget.currentItem().text()
+            title = index.data()
             td = Timeshift(self, self.sh, title, data[1], self.settings_helper)
             td.show()
             td.start_player.connect(self.play)
 
     def bookmark_current(self):
-        if self.ui.listWidget.count() < 1:
-            return
-        item = self.ui.listWidget.currentItem()
-        data = item.data(Qt.ItemDataRole.UserRole)
+        index = self.ui.channelView.currentIndex()
+        data = index.data(Qt.ItemDataRole.UserRole)
         if data and data[1] not in self.bookmarks:
             self.bookmarks.append(data[1])
-            item.setIcon(QIcon.fromTheme('folder-bookmark'))
+            self.channel_model.update_row(self.channel_filter.mapToSource(index).row())
 
     def bookmark_remove(self):
-        if self.ui.listWidget.count() < 1:
-            return
-        item = self.ui.listWidget.currentItem()
-        data = item.data(Qt.ItemDataRole.UserRole)
+        index = self.ui.channelView.currentIndex()
+        data = index.data(Qt.ItemDataRole.UserRole)
         if data and data[1] in self.bookmarks:
             self.bookmarks.remove(data[1])
-            item.setIcon(QIcon.fromTheme('video-webm'))
+            self.channel_model.update_row(self.channel_filter.mapToSource(index).row())
 
     def view_bookmarks(self, check):
-        for item in self.ui.listWidget.findItems("", Qt.MatchFlag.MatchContains):
-            data = item.data(Qt.ItemDataRole.UserRole)
-            item.setHidden(
-                (not check and self.search_term.lower() not in item.text().lower()
-                 and bool(data))
-                or
-                (check and (self.search_term.lower() not in item.text().lower()
-                            or not bool(data)
-                            or (bool(data) and data[1] not in self.bookmarks))))
+        self.channel_filter.set_filter(self.search_term, check)
         self.set_focus()
 
     def show_about(self):
@@ -410,25 +476,23 @@ def update_guide():
     settings = SettingsHelper().get_settings()
     guide_addr = settings.value('guide/addr', type=str)
     if not guide_addr:
-        playlist, status, response = "", [], None
         playlist_addr = settings.value('playlist/addr', type=str)
         try:
-            response = request.urlopen(playlist_addr)
+            with request.urlopen(playlist_addr) as response:
+                # the header is all that is read
+                guide_addr = guide_address(
+                    io.TextIOWrapper(response, encoding='utf-8-sig'))
         except error.URLError as e:
-            status.append(str(e.reason))
+            logging.error(str(e.reason))
         except ValueError as e:
-            status.append(str(e))
-        playlist += response.read().decode('utf-8') if response else ""
-        for line in playlist.splitlines():
-            if line.startswith('#EXTM3U'):
-                match = re.match(r'.*url-tvg=([^\s,]*).*', line)
-                guide_addr = match.group(1).strip('"') if match else ""
-                break
+            logging.error(str(e))
     if guide_addr:
-        ScheduleHandler(guide_addr)
+        ScheduleHandler(guide_addr,
+                        workers=settings.value('guide/workers', type=int))
 
 
 def main():
+    multiprocessing.freeze_support()
     logging.getLogger().setLevel(logging.DEBUG)
     if sys.hexversion < 0x030600f0:
         logging.error("E: python version is too old, 3.6 or higher needed")
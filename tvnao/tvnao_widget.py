@@ -15,10 +15,13 @@ class Ui_Form(object):
         Form.resize(325, 700)
         self.verticalLayout = QtWidgets.QVBoxLayout(Form)
         self.verticalLayout.setObjectName("verticalLayout")
-        self.listWidget = QtWidgets.QListWidget(parent=Form)
-        self.listWidget.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-        self.listWidget.setObjectName("listWidget")
-        self.verticalLayout.addWidget(self.listWidget)
+        self.channelView = QtWidgets.QListView(parent=Form)
+        self.channelView.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.channelView.setLayoutMode(QtWidgets.QListView.LayoutMode.Batched)
+        self.channelView.setUniformItemSizes(True)
+        self.channelView.setBatchSize(500)
+        self.channelView.setObjectName("channelView")
+        self.verticalLayout.addWidget(self.channelView)
         self.guideBrowser = QtWidgets.QTextBrowser(parent=Form)
         self.guideBrowser.setMaximumSize(QtCore.QSize(16777215, 150))
         self.guideBrowser.setFrameShape(QtWidgets.QFrame.Shape.StyledPanel)
@@ -31,6 +34,13 @@ class Ui_Form(object):
         self.guideBrowser.setOpenLinks(False)
         self.guideBrowser.setObjectName("guideBrowser")
         self.verticalLayout.addWidget(self.guideBrowser)
+        self.guideProgress = QtWidgets.QProgressBar(parent=Form)
+        self.guideProgress.setVisible(False)
+        self.guideProgress.setMaximumSize(QtCore.QSize(16777215, 6))
+        self.guideProgress.setMaximum(0)
+        self.guideProgress.setTextVisible(False)
+        self.guideProgress.setObjectName("guideProgress")
+        self.verticalLayout.addWidget(self.guideProgress)
         self.horizontalLayout_2 = QtWidgets.QHBoxLayout()
         self.horizontalLayout_2.setObjectName("horizontalLayout_2")
         self.guideFullButton = QtWidgets.QPushButton(parent=Form)
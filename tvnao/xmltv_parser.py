@@ -0,0 +1,92 @@
+# Copyright (c) 2016-2025 Blaze <blaze@vivaldi.net>
+# Licensed under the GNU General Public License, version 3 or later.
+# See the file http://www.gnu.org/copyleft/gpl.txt.
+
+import calendar
+import gzip
+import logging
+from typing import BinaryIO, Callable, Iterator, Optional, Tuple
+from xml.etree.ElementTree import iterparse, ParseError
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def open_guide(filename: str) -> BinaryIO:
+    """
+        Opens a plain or gzipped XMLTV file
+    """
+    with open(filename, 'rb') as file:
+        magic = file.read(2)
+    return gzip.open(filename, 'rb') if magic == GZIP_MAGIC\
+        else open(filename, 'rb')
+
+
+def parse_time(value: str,
+               to_epoch: Optional[Callable[[int], int]] = None) -> int:
+    """
+        Converts an XMLTV 'YYYYmmddHHMMSS +HHMM' time to epoch seconds.
+        A time without a zone is local, `to_epoch` converts it from
+        seconds counted as if it were UTC.
+    """
+    stamp, _, zone = value.strip().partition(' ')
+    stamp = stamp.ljust(14, '0')
+    seconds = calendar.timegm((
+        int(stamp[0:4]), int(stamp[4:6]), int(stamp[6:8]),
+        int(stamp[8:10]), int(stamp[10:12]), int(stamp[12:14])))
+    zone = zone.strip()
+    if len(zone) == 5 and zone[0] in '+-' and zone[1:].isdigit():
+        offset = int(zone[1:3]) * 3600 + int(zone[3:5]) * 60
+        return seconds - (offset if zone[0] == '+' else -offset)
+    return to_epoch(seconds) if to_epoch else seconds
+
+
+def iter_programmes(file: BinaryIO, shift: int = 0,
+                    to_epoch: Optional[Callable[[int], int]] = None,
+                    since: int = 0) -> Iterator[Tuple[str, int, int, str]]:
+    """
+        Streams (channel, start, stop, title) rows of the programmes
+        starting from `since`, clearing every parsed element so memory
+        use does not grow with the file size. A programme without
+        a stop, which XMLTV allows, ends where the next one of its
+        channel starts.
+    """
+    root, pending, skipped = None, {}, 0
+    try:
+        for event, element in iterparse(file, events=('start', 'end')):
+            if root is None:
+                root = element
+                continue
+            if event != 'end' or element.tag not in ('programme', 'channel'):
+                continue
+            if element.tag == 'programme':
+                channel = element.get('channel')
+                start, stop = element.get('start'), element.get('stop')
+                title = element.findtext('title')
+                try:
+                    start = parse_time(start, to_epoch) + shift
+                    if stop is not None:
+                        stop = parse_time(stop, to_epoch) + shift
+                except (AttributeError, ValueError):
+                    start = None
+                if not channel or not title or start is None:
+                    skipped += 1
+                else:
+                    if channel in pending:
+                        previous_start, previous_title = pending.pop(channel)
+                        if previous_start >= start:
+                            skipped += 1
+                        elif previous_start >= since:
+                            yield channel, previous_start, start, previous_title
+                    if stop is None:
+                        pending[channel] = (start, title)
+                    elif start >= since:
+                        yield channel, start, stop, title
+            element.clear()
+            root.clear()
+    except ParseError as e:
+        logging.error(f'invalid XMLTV data: {e}')
+    # the last programme of a channel has nothing to end it
+    skipped += len(pending)
+    if skipped:
+        logging.warning(f'skipped {skipped} XMLTV programmes lacking a '
+                        'channel, a title, valid times or a stop')